@@ -3,6 +3,7 @@ Vercel Serverless Entry Point — strips /api prefix before routing to FastAPI
 """
 import sys
 import os
+import logging
 
 # Add backend directory to Python path
 backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
@@ -12,7 +13,14 @@ sys.path.insert(0, os.path.abspath(backend_dir))
 os.chdir(os.path.abspath(backend_dir))
 
 # Import the FastAPI app
-from main import app as _fastapi_app  # noqa: E402
+from main import app as _fastapi_app, warm_up  # noqa: E402
+
+# Build the tree index during the function's init phase, so the first request
+# of a cold start is answered from memory (the snapshot, when one is bundled).
+try:
+    warm_up()
+except Exception:  # still serve — the index builds lazily on first use
+    logging.exception("warm-up failed")
 
 
 class StripApiPrefix:
@@ -0,0 +1,120 @@
+"""
+Read/write concurrency benchmark for the SQLite engine profiles in db.py.
+
+Each profile gets its own copy of the database. Reader threads run the
+queries behind /person, /children and /members while writer threads insert
+members and bump the data version in short transactions, the way
+POST /members does. Reported per profile: reads/s, writes/s, read latency
+percentiles, and writes that failed with "database is locked".
+
+    python bench_sqlite.py                          # backend/family_tree.db, 10 s per profile
+    python bench_sqlite.py --readers 8 --writers 4 --seconds 20 --db other.db
+"""
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from db import default_sqlite_path, make_engine
+from migrations import upgrade
+
+
+READ_QUERIES = [
+    ("SELECT * FROM family_members WHERE id = :id", lambda ids: {"id": random.choice(ids)}),
+    ("SELECT * FROM family_members WHERE parent_id = :id ORDER BY full_name", lambda ids: {"id": random.choice(ids)}),
+    ("SELECT id, full_name FROM family_members WHERE full_name > :n ORDER BY full_name, id LIMIT 100",
+     lambda ids: {"n": ""}),
+]
+
+
+def _reader(engine, ids, stop, latencies, counts):
+    n = 0
+    with engine.connect() as conn:
+        while not stop.is_set():
+            sql, params = random.choice(READ_QUERIES)
+            t0 = time.perf_counter()
+            conn.execute(text(sql), params(ids)).fetchall()
+            conn.rollback()  # end the read transaction so WAL can checkpoint
+            latencies.append(time.perf_counter() - t0)
+            n += 1
+    counts.append(n)
+
+
+def _writer(engine, ids, stop, counts, failures):
+    n = failed = 0
+    while not stop.is_set():
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO family_members (full_name, branch_name, parent_id, is_alive) "
+                         "VALUES (:name, 'bench', :pid, 1)"),
+                    {"name": f"bench {random.random():.8f}", "pid": random.choice(ids)},
+                )
+                conn.execute(text("UPDATE data_version SET version = version + 1 WHERE id = 1"))
+            n += 1
+        except OperationalError:
+            failed += 1
+    counts.append(n)
+    failures.append(failed)
+
+
+def run(profile: str, source: Path, readers: int, writers: int, seconds: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        shutil.copy(source, path)
+        engine = make_engine(f"sqlite:///{path}", profile)
+        upgrade(engine)
+        with engine.connect() as conn:
+            ids = [r[0] for r in conn.execute(text("SELECT id FROM family_members"))] or [0]
+            mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+
+        stop = threading.Event()
+        latencies, read_counts, write_counts, failures = [], [], [], []
+        threads = [threading.Thread(target=_reader, args=(engine, ids, stop, latencies, read_counts))
+                   for _ in range(readers)]
+        threads += [threading.Thread(target=_writer, args=(engine, ids, stop, write_counts, failures))
+                    for _ in range(writers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    lat = sorted(latencies) or [0.0]
+    return {
+        "profile": profile,
+        "journal": mode,
+        "reads/s": sum(read_counts) / seconds,
+        "writes/s": sum(write_counts) / seconds,
+        "read p50 ms": statistics.median(lat) * 1000,
+        "read p99 ms": lat[int(len(lat) * 0.99) - 1 if len(lat) > 1 else 0] * 1000,
+        "locked": sum(failures),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--db", type=Path, default=default_sqlite_path)
+    ap.add_argument("--readers", type=int, default=4)
+    ap.add_argument("--writers", type=int, default=2)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    args = ap.parse_args()
+
+    results = [run(p, args.db, args.readers, args.writers, args.seconds) for p in ("default", "tuned")]
+    cols = list(results[0])
+    print(" | ".join(f"{c:>12}" for c in cols))
+    for r in results:
+        print(" | ".join(f"{v:>12.1f}" if isinstance(v, float) else f"{v!s:>12}" for v in r.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Cold-start profile of the API entry point.
+
+Each run starts a fresh interpreter with `python -X importtime`, imports the
+app the way api/index.py does and calls warm_up(), against a temporary copy
+of the database so nothing in the tree is touched. Reported: wall time for
+import + warm-up, and import time per top-level package (self time summed,
+median over the runs), so a new eager import shows up as a number.
+
+    python bench_startup.py                    # 5 runs, READ_ONLY like Vercel
+    python bench_startup.py --runs 10 --rw     # read-write mode (runs migrations)
+    python bench_startup.py --json             # machine-readable, for CI diffs
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+from db import default_sqlite_path
+
+BACKEND_DIR = Path(__file__).resolve().parent
+IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+PROBE = """
+import time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+main.warm_up()
+t2 = time.perf_counter()
+print(f"{(t1 - t0) * 1000:.1f} {(t2 - t1) * 1000:.1f}")
+"""
+
+
+def one_run(env: dict) -> tuple:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    import_ms, warm_ms = map(float, proc.stdout.split()[-2:])
+    per_package = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME.match(line)
+        if m:
+            per_package[m.group(4).split(".")[0]] += int(m.group(1)) / 1000
+    return import_ms, warm_ms, per_package
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--rw", action="store_true", help="read-write mode instead of READ_ONLY")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_copy = Path(tmp) / "family_tree.db"
+        shutil.copy(default_sqlite_path, db_copy)
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_copy}", "READ_ONLY": "0" if args.rw else "1"}
+        # One untimed run so every run after it finds compiled bytecode
+        one_run(env)
+        runs = [one_run(env) for _ in range(args.runs)]
+
+    packages = {name for _, _, per in runs for name in per}
+    per_package = {name: statistics.median(per.get(name, 0.0) for _, _, per in runs) for name in packages}
+    report = {
+        "mode": "rw" if args.rw else "read_only",
+        "import_ms": statistics.median(r[0] for r in runs),
+        "warm_up_ms": statistics.median(r[1] for r in runs),
+        "packages_ms": dict(sorted(per_package.items(), key=lambda kv: -kv[1])),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['mode']}: import {report['import_ms']:.1f} ms, warm-up {report['warm_up_ms']:.1f} ms "
+          f"(median of {args.runs})")
+    for name, ms in list(report["packages_ms"].items())[:args.top]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Data version and HTTP validators for the read endpoints.
+
+A single-row `data_version` table holds a counter that every write bumps
+inside its own transaction. Read responses carry it as a strong ETag
+("v42") plus a Last-Modified from the same row, with `Cache-Control:
+no-cache` so browsers and the edge revalidate each time — an unchanged
+tree then costs only a 304. The counter lives in SQLite rather than in
+memory so that every worker process (and the tree index in each of them)
+sees writes made by the others.
+
+The same row carries `db_id`, a random token set once per database
+(migration 6). Versions start at 1 everywhere, so the version alone can't
+tell two databases apart; the tree index snapshot is matched on both.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS data_version (
+        id         INTEGER PRIMARY KEY CHECK (id = 1),
+        version    INTEGER NOT NULL,
+        updated_at TEXT    NOT NULL
+    )
+"""
+
+
+class NotModified(Exception):
+    """Raised from a dependency when the client's copy is still current."""
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+def read_version(db: Session) -> Tuple[int, datetime]:
+    row = db.execute(text("SELECT version, updated_at FROM data_version WHERE id = 1")).first()
+    if row is None:
+        return 0, datetime.fromtimestamp(0, timezone.utc)
+    return row[0], datetime.fromisoformat(row[1])
+
+
+def read_db_id(db: Session) -> Optional[str]:
+    """This database's identity, or None before migration 6."""
+    try:
+        return db.execute(text("SELECT db_id FROM data_version WHERE id = 1")).scalar()
+    except OperationalError:
+        return None
+
+
+def bump_version(db: Session) -> Tuple[int, int]:
+    """Advance the counter in the caller's transaction. Returns (old, new)."""
+    db.execute(
+        text("UPDATE data_version SET version = version + 1, updated_at = :now WHERE id = 1"),
+        {"now": now_iso()},
+    )
+    new = read_version(db)[0]
+    return new - 1, new
+
+
+def validators(version: int, updated_at: datetime) -> Dict[str, str]:
+    return {
+        "ETag": f'"v{version}"',
+        "Last-Modified": format_datetime(updated_at, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+
+def check_not_modified(request: Request, version: int, updated_at: datetime) -> Dict[str, str]:
+    """Validator headers for this version; raises NotModified if the client already has it."""
+    headers = validators(version, updated_at)
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        tags = {t.strip().removeprefix("W/") for t in inm.split(",")}
+        if headers["ETag"] in tags or "*" in tags:
+            raise NotModified(headers)
+        return headers
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        since: Optional[datetime]
+        try:
+            since = parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and since.tzinfo is not None and updated_at <= since:
+            raise NotModified(headers)
+    return headers
@@ -1,10 +1,51 @@
+"""
+Database engine and sessions.
+
+SQLite runs with a tuned profile by default: WAL (readers never wait for a
+writer and vice versa), synchronous=NORMAL (safe under WAL, far fewer
+fsyncs), a memory-mapped file and a larger page cache, temp tables in
+memory, and a busy_timeout so a writer queues behind another instead of
+failing with "database is locked". The PRAGMAs are per-connection, so they
+are applied from a connect hook on every connection the pool opens.
+
+    SQLITE_PROFILE=tuned|default   # default = stock pysqlite settings
+    SQLITE_MMAP_SIZE=134217728     # bytes
+    SQLITE_CACHE_SIZE=-32768       # pages, or KiB when negative
+    SQLITE_BUSY_TIMEOUT_MS=5000
+    DB_POOL_SIZE=5  DB_MAX_OVERFLOW=10
+    READ_ONLY=1                    # serve a frozen copy; on by default on Vercel
+
+In read-only mode the file is opened with mode=ro&immutable=1, so SQLite
+takes no locks and never looks for a journal; the write endpoints answer
+503 instead. `python migrations.py freeze` prepares the bundled file.
+
+bench_sqlite.py compares the two profiles under concurrent reads and writes.
+
+Alongside the blocking engine there is an asyncio one over aiosqlite, with
+the same profile, for the async read handlers in main.py: they await the
+database instead of parking a threadpool worker on it.
+"""
 import os
+import sqlite3
+import logging
 from pathlib import Path
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from urllib.parse import quote
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
-load_dotenv()
+
+def _load_dotenv() -> None:
+    """Same lookup as dotenv.load_dotenv() from here, minus the import when there is no .env."""
+    for folder in Path(__file__).resolve().parents:
+        if (folder / ".env").is_file():
+            from dotenv import load_dotenv
+            load_dotenv(folder / ".env")
+            return
+
+
+_load_dotenv()
 
 default_sqlite_path = Path(__file__).resolve().parent / "family_tree.db"
 env_url = os.getenv("DATABASE_URL")
@@ -15,13 +56,88 @@ if env_url and env_url.startswith("sqlite"):
 else:
     DATABASE_URL = f"sqlite:///{default_sqlite_path}"
 
-engine = create_engine(
-    DATABASE_URL,
-    future=True,
-    connect_args={"check_same_thread": False},
-)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned")
+READ_ONLY = os.getenv("READ_ONLY", "1" if os.getenv("VERCEL") else "0").lower() in ("1", "true", "yes")
+
+TUNED_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 128 * 1024 * 1024)),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -32 * 1024)),
+    "temp_store": "MEMORY",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+}
+# Journal and locking settings mean nothing to an immutable file
+READ_ONLY_PRAGMAS = {k: TUNED_PRAGMAS[k] for k in ("mmap_size", "cache_size", "temp_store")}
+
+
+def _apply_pragmas(dbapi_conn, pragmas: dict) -> None:
+    cur = dbapi_conn.cursor()
+    try:
+        for name, value in pragmas.items():
+            try:
+                cur.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.OperationalError as e:
+                # journal_mode=WAL needs a writable directory for the -wal/-shm
+                # files; on a read-only mount keep the stock journal instead.
+                logging.warning("db: PRAGMA %s = %s not applied (%s)", name, value, e)
+    finally:
+        cur.close()
+
+
+def read_only_url(url: str) -> str:
+    """sqlite:///x.db → sqlite:///file:x.db?mode=ro&immutable=1&uri=true"""
+    path = quote(make_url(url).database)
+    return f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true"
+
+
+def _engine_options(url: str, profile: str, read_only: bool) -> tuple:
+    """(url, pool kwargs, PRAGMAs or None) shared by the sync and async engines."""
+    if read_only:
+        url = read_only_url(url)
+    kwargs = {}
+    if ":memory:" not in url and "mode=memory" not in url:
+        # File databases get a QueuePool; one connection per concurrent request
+        kwargs.update(
+            pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        )
+    pragmas = None
+    if profile == "tuned":
+        pragmas = READ_ONLY_PRAGMAS if read_only else TUNED_PRAGMAS
+    return url, kwargs, pragmas
+
+
+def make_engine(url: str = DATABASE_URL, profile: str = SQLITE_PROFILE, read_only: bool = False) -> Engine:
+    """SQLite engine with the given profile ('tuned' or 'default'), optionally read-only."""
+    url, kwargs, pragmas = _engine_options(url, profile, read_only)
+    eng = create_engine(
+        url,
+        future=True,
+        connect_args={"check_same_thread": False},
+        **kwargs,
+    )
+    if pragmas:
+        event.listen(eng, "connect", lambda conn, _record: _apply_pragmas(conn, pragmas))
+    return eng
+
+
+def make_async_engine(url: str = DATABASE_URL, profile: str = SQLITE_PROFILE,
+                      read_only: bool = False) -> AsyncEngine:
+    """make_engine() over aiosqlite."""
+    url, kwargs, pragmas = _engine_options(url, profile, read_only)
+    eng = create_async_engine(make_url(url).set(drivername="sqlite+aiosqlite"), **kwargs)
+    if pragmas:
+        event.listen(eng.sync_engine, "connect", lambda conn, _record: _apply_pragmas(conn, pragmas))
+    return eng
+
+
+engine = make_engine(read_only=READ_ONLY)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
+async_engine = make_async_engine(read_only=READ_ONLY)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -32,3 +148,7 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -3,22 +3,45 @@
 البنية:
   ROW n   → col 1 = 'الـرقـم العائـلـي'  + col 7 = اسم الشخص
   ROW n+2 → col 1 = الرقم العائلي مثل '1-1-0-0-...'
+
+الملفات تُقرأ بالتوازي في عمليات منفصلة (كل ملف يُفتح مرة واحدة)، والإدخال
+يتم من عملية واحدة فقط وبترتيب الملفات نفسه.
+
+إعادة التشغيل تطبّق الفرق فقط (import_manifest.py): الملف الذي لم تتغيّر
+بصمته (SHA-256) لا يُفتح أصلًا، والورقة التي لم تتغيّر قيمها تُتخطّى، وما
+تغيّر يُقارَن بالرقم العائلي فيُدخَل الجديد ويُعدَّل المتغيّر ويُحذف ما اختفى.
+
+    python import_family_tree.py [--workers N] [--full]   # الافتراضي: عدد الأنوية
+    --full  يتجاهل البصمات ويقارن كل الأوراق
 """
 
+import os
 import re
+import argparse
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from db import SessionLocal, engine, Base
+from db import SessionLocal, engine
 from models import FamilyMember
-
-Base.metadata.create_all(bind=engine)
+from lineage import rebuild_paths
+from migrations import upgrade
+from cache import bump_version
+from integrity import creates_cycle
+from photos import release
+from import_manifest import (
+    SheetDiff, file_hash, sheet_hash, record_hash, stored_file_hashes, stored_sheet_hash,
+    record_file, record_sheet, manifest_empty, previous_members, adopt_members, diff_sheet,
+    remember_members, forget_members,
+)
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
 
 FOLDER = Path(__file__).resolve().parent.parent / "FAMILY-TREE"
+IMPORTER = "family_tree"
 
 
 # ─── نظام الأرقام العائلية ─────────────────────────────────────────────────
@@ -60,16 +83,18 @@ def clean_name(val) -> Optional[str]:
 
 # ─── قراءة ملف سجل البيطار ─────────────────────────────────────────────────
 
-def parse_register(path: Path, branch: str) -> List[Dict]:
+def parse_register(path: Path, branch: str, wb=None) -> List[Dict]:
     """
     يمسح الملف بحثًا عن هيكل:
       صف يحتوي 'الرقم العائلي' في col 1  →  اسم في col 7
       بعده بـ 1-3 صفوف: الرقم العائلي الرقمي في col 1
+    wb: المصنّف لو كان مفتوحًا مسبقًا.
     """
     import xlrd
 
     people: List[Dict] = []
-    wb = xlrd.open_workbook(str(path))
+    if wb is None:
+        wb = xlrd.open_workbook(str(path))
     sh = wb.sheets()[0]
     logging.info("📄 %s | صفوف: %d", path.name, sh.nrows)
 
@@ -111,46 +136,111 @@ def parse_register(path: Path, branch: str) -> List[Dict]:
     return people
 
 
-# ─── إدخال الداتابيز ───────────────────────────────────────────────────────
+def read_workbook(path: Path) -> Tuple[Path, Optional[str], Optional[str], Optional[List[Dict]]]:
+    """
+    يفتح الملف مرة واحدة ويحلّله — يعمل داخل عملية من الـ pool.
+    يُرجع (الملف، اسم الورقة، بصمة قيمها، الأشخاص).
+    None بدل القائمة = شجرة رسومية بلا صفوف (تُتخطّى).
+    """
+    import xlrd
+
+    branch = re.sub(r'\s*\(\d+\)\s*', '', path.stem).strip()
+    try:
+        wb = xlrd.open_workbook(str(path))
+        rows = sum(s.nrows for s in wb.sheets())
+    except Exception:
+        rows = 0
+    if rows == 0:
+        return path, None, None, None
+    sh = wb.sheets()[0]
+    return path, sh.name, sheet_hash(sh), parse_register(path, branch, wb)
+
 
-def insert_people(people: List[Dict], db: Session) -> None:
-    if not people:
+def read_all(files: List[Path], workers: int) -> Iterator[tuple]:
+    """نتائج الملفات بترتيبها الأصلي، وهي تُحلَّل بالتوازي على `workers` عملية."""
+    if workers <= 1 or len(files) <= 1:
+        yield from map(read_workbook, files)
         return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        yield from pool.map(read_workbook, files)
 
-    num_to_member: Dict[str, FamilyMember] = {}
 
-    for p in people:
-        m = FamilyMember(
-            full_name=p["full_name"],
-            branch_name=p["branch_name"],
-        )
-        db.add(m)
-        norm = normalize_num(p["family_number"])
-        # لو فيه تكرار في الرقم، خليه يُكتب
-        num_to_member[norm] = m
+# ─── إدخال الداتابيز ───────────────────────────────────────────────────────
 
+def apply_people(people: List[Dict], file_name: str, db: Session,
+                 adopt: bool = False) -> Tuple[SheetDiff, List[str]]:
+    """
+    يطبّق على الداتابيز الفرق بين أشخاص الورقة وما استُورد منها آخر مرة،
+    داخل معاملة المستدعي (بدون commit). يُرجع الفرق وصور المحذوفين، تُحرَّر
+    بعد الـ commit.
+    adopt: أول تشغيل على داتابيز استُوردت قبل وجود السجل (import_members فارغ).
+    """
+    ordered = [(normalize_num(p["family_number"]), p) for p in people]
+    # لو فيه تكرار في الرقم، الأخير يُكتب
+    records: Dict[str, Dict] = dict(ordered)
+
+    previous = previous_members(db, file_name)
+    # أول تشغيل على داتابيز استُوردت قبل وجود السجل: تبنّي الموجودين بدل تكرارهم
+    adopted = adopt_members(db, ordered) if adopt and not previous else {}
+    diff = diff_sheet({**previous, **adopted}, records)
+    diff.adopted = len(adopted)
+    ids = {fnum: mid for fnum, (mid, _) in {**previous, **adopted}.items() if mid is not None}
+
+    # جدد
+    new_members = {}
+    for fnum in diff.inserts:
+        m = FamilyMember(full_name=records[fnum]["full_name"], branch_name=records[fnum]["branch_name"])
+        db.add(m)
+        new_members[fnum] = m
     db.flush()
+    ids.update({fnum: m.id for fnum, m in new_members.items()})
+
+    # متغيّرون
+    if diff.updates:
+        db.execute(
+            text("UPDATE family_members SET full_name = :name, branch_name = :branch WHERE id = :id"),
+            [{"name": records[f]["full_name"], "branch": records[f]["branch_name"], "id": ids[f]}
+             for f in diff.updates],
+        )
 
-    links = 0
-    for p in people:
-        norm = normalize_num(p["family_number"])
-        pnum = parent_num(p["family_number"])
-        if pnum is None:
+    # محذوفون: الأبناء ينتقلون للجد كما في DELETE /members
+    images = []
+    for fnum, mid in diff.deletes:
+        if mid is None:
+            continue
+        parent_id, image_url = db.execute(
+            text("SELECT parent_id, image_url FROM family_members WHERE id = :id"), {"id": mid},
+        ).one()
+        db.execute(text("UPDATE family_members SET parent_id = :p WHERE parent_id = :id"),
+                   {"p": parent_id, "id": mid})
+        db.execute(text("DELETE FROM family_members WHERE id = :id"), {"id": mid})
+        images.append(image_url)
+    if diff.deletes:
+        forget_members(db, file_name, [fnum for fnum, _ in diff.deletes])
+
+    # ربط الأب: للجدد والمتبنَّين، ولمن أُدخل أبوه الآن
+    fresh = set(new_members) | set(adopted)
+    for fnum in records:
+        pnum = parent_num(fnum)
+        if fnum not in ids or pnum not in ids or not (fnum in fresh or pnum in new_members):
             continue
-        child = num_to_member.get(norm)
-        parent = num_to_member.get(pnum)
-        if child and parent and child.id != parent.id:
-            child.parent_id = parent.id
-            links += 1
+        child, parent = ids[fnum], ids[pnum]
+        if creates_cycle(db, child, parent):
+            logging.warning("⚠️ %s: %s تحت %s يصنع حلقة، تُرك بلا ربط", file_name, fnum, pnum)
+            continue
+        db.execute(text("UPDATE family_members SET parent_id = :p WHERE id = :id"), {"p": parent, "id": child})
+        diff.relinked += 1
 
-    db.commit()
-    logging.info("✅ أُدخل %d شخص | ربط %d علاقة أب", len(people), links)
+    changed = diff.inserts + diff.updates
+    if changed:
+        remember_members(db, file_name, [(f, ids[f], record_hash(records[f])) for f in changed])
+    return diff, images
 
 
 # ─── main ──────────────────────────────────────────────────────────────────
 
-def main():
-    import xlrd
+def main(workers: int = os.cpu_count() or 1, full: bool = False):
+    upgrade(engine)
 
     files = list(FOLDER.glob("*.xls")) + list(FOLDER.glob("*.xlsx"))
     if not files:
@@ -158,31 +248,58 @@ def main():
         return
 
     db = SessionLocal()
-    total = 0
+    totals = SheetDiff()
+    skipped = 0
     try:
-        for path in files:
-            branch = re.sub(r'\s*\(\d+\)\s*', '', path.stem).strip()
-
+        # بصمة كل ملف: ما لم يتغيّر منذ آخر استيراد لا يُفتح أصلًا
+        hashes = {path: file_hash(path) for path in files}
+        known = {} if full else stored_file_hashes(db, IMPORTER)
+        todo = [path for path in files if known.get(path.name) != hashes[path]]
+        skipped = len(files) - len(todo)
+        # يُقرَّر مرة واحدة قبل أول ملف: بعده لن يكون السجل فارغًا
+        legacy = manifest_empty(db)
+
+        # الكاتب الوحيد: هذه العملية، بترتيب الملفات
+        for path, sheet, shash, people in read_all(todo, workers):
             # ملفات الشجرة الرسومية (صفوف = 0)
-            try:
-                wb = xlrd.open_workbook(str(path))
-                rows = sum(s.nrows for s in wb.sheets())
-            except Exception:
-                rows = 0
-
-            if rows == 0:
+            if people is None:
                 logging.info("⏭ %s (شجرة رسومية، تخطّي)", path.name)
+                record_file(db, IMPORTER, path.name, hashes[path])
+                db.commit()
                 continue
 
-            people = parse_register(path, branch)
+            # تغيّر الملف لا قيمه (تنسيق مثلًا)
+            if not full and stored_sheet_hash(db, path.name, sheet) == shash:
+                logging.info("⏭ %s (القيم لم تتغيّر)", path.name)
+                record_file(db, IMPORTER, path.name, hashes[path])
+                db.commit()
+                skipped += 1
+                continue
 
             if not people:
+                # يُقارن كقائمة فارغة: من استُورد منه سابقًا يُحذف، والبصمات تُسجَّل
                 logging.warning("⚠️ %s: لم تُعثر على أشخاص", path.name)
-                continue
 
-            logging.info("👥 %s → %d شخص", path.name, len(people))
-            insert_people(people, db)
-            total += len(people)
+            diff, images = apply_people(people, path.name, db, adopt=legacy)
+            record_sheet(db, path.name, sheet, shash)
+            record_file(db, IMPORTER, path.name, hashes[path])
+            if diff.changed or diff.relinked:
+                # المسارات في المعاملة نفسها: لو فشل ملف لاحق يبقى ما ثُبّت متّسقًا
+                rebuild_paths(db.connection())
+                bump_version(db)
+            db.commit()
+            for image_url in images:
+                release(db, image_url)
+
+            logging.info("👥 %s → +%d جديد | ~%d معدّل | -%d محذوف | %d كما هو | ربط %d%s",
+                         path.name, len(diff.inserts), len(diff.updates), len(diff.deletes),
+                         diff.unchanged, diff.relinked,
+                         f" | تبنّي {diff.adopted} موجود" if diff.adopted else "")
+            totals.inserts += diff.inserts
+            totals.updates += diff.updates
+            totals.deletes += diff.deletes
+            totals.unchanged += diff.unchanged
+            totals.relinked += diff.relinked
 
     except Exception as e:
         logging.exception("خطأ: %s", e)
@@ -190,8 +307,15 @@ def main():
     finally:
         db.close()
 
-    logging.info("🎉 الاستيراد اكتمل: مجموع %d شخص", total)
+    logging.info("🎉 الاستيراد اكتمل: +%d جديد | ~%d معدّل | -%d محذوف | %d كما هو | %d ملف بلا تغيير",
+                 len(totals.inserts), len(totals.updates), len(totals.deletes), totals.unchanged, skipped)
 
 
 if __name__ == "__main__":
-    main()
+    ap = argparse.ArgumentParser(description="استيراد ملفات FAMILY-TREE")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="عدد العمليات لقراءة الملفات (1 = بدون توازي)")
+    ap.add_argument("--full", action="store_true",
+                    help="تجاهل بصمات الملفات والأوراق وقارن كل شيء")
+    args = ap.parse_args()
+    main(args.workers, args.full)
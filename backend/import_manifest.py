@@ -0,0 +1,220 @@
+"""
+Import manifest: what the importers last loaded, so a re-run applies only
+what changed in the FAMILY-TREE workbooks.
+
+  import_files    (importer, file)       → SHA-256 of the workbook bytes
+  import_sheets   (file, sheet)          → SHA-256 of the sheet's cell values
+  import_members  (file, family_number)  → member id + hash of the source record
+
+A workbook whose bytes are unchanged is skipped before it is parsed; one
+that changed only in formatting (same cell values) is skipped after. A
+changed sheet is diffed by family number against import_members:
+
+  new number          → insert
+  record changed      → update full_name / branch_name
+  number gone         → delete (children move up to the grandparent, like DELETE /members)
+  parent number moved → relink parent_id
+
+Comparing source hashes with source hashes means edits made through the
+API to an imported member stay, until that member's own row in the
+workbook changes. A member deleted through the API is not brought back.
+
+On the first run over a database imported before the manifest existed
+(import_members still empty when the run starts), a file's records adopt
+the unclaimed members of their branch, aligned by name in id order (the
+order the old importer inserted them), instead of adding everyone again.
+After that, a new workbook only ever inserts: members added through the
+API are never claimed. The tables come from migration 5.
+"""
+import json
+import hashlib
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from cache import now_iso
+
+CREATE_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS import_files (
+        importer     TEXT NOT NULL,
+        name         TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        imported_at  TEXT NOT NULL,
+        PRIMARY KEY (importer, name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS import_sheets (
+        file_name    TEXT NOT NULL,
+        sheet        TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        PRIMARY KEY (file_name, sheet)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS import_members (
+        file_name     TEXT    NOT NULL,
+        family_number TEXT    NOT NULL,
+        member_id     INTEGER NOT NULL,
+        record_hash   TEXT    NOT NULL,
+        PRIMARY KEY (file_name, family_number)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_import_members_member_id ON import_members (member_id)",
+]
+
+
+# ─── Hashes ──────────────────────────────────────────────────────────────────
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sheet_hash(sheet) -> str:
+    """Hash of an xlrd sheet's cell values, row by row — blind to formatting."""
+    digest = hashlib.sha256()
+    for r in range(sheet.nrows):
+        digest.update(json.dumps(sheet.row_values(r), ensure_ascii=False, default=str).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def record_hash(person: Dict) -> str:
+    return hashlib.sha256(f"{person['full_name']}\x1f{person['branch_name']}".encode()).hexdigest()
+
+
+# ─── Stored state ────────────────────────────────────────────────────────────
+
+def stored_file_hashes(db: Session, importer: str) -> Dict[str, str]:
+    rows = db.execute(text("SELECT name, content_hash FROM import_files WHERE importer = :i"), {"i": importer})
+    return dict(rows.fetchall())
+
+
+def stored_sheet_hash(db: Session, file_name: str, sheet: str) -> Optional[str]:
+    return db.execute(
+        text("SELECT content_hash FROM import_sheets WHERE file_name = :f AND sheet = :s"),
+        {"f": file_name, "s": sheet},
+    ).scalar()
+
+
+def record_file(db: Session, importer: str, name: str, content_hash: str) -> None:
+    db.execute(
+        text("INSERT OR REPLACE INTO import_files (importer, name, content_hash, imported_at) "
+             "VALUES (:i, :n, :h, :t)"),
+        {"i": importer, "n": name, "h": content_hash, "t": now_iso()},
+    )
+
+
+def record_sheet(db: Session, file_name: str, sheet: str, content_hash: str) -> None:
+    db.execute(
+        text("INSERT OR REPLACE INTO import_sheets (file_name, sheet, content_hash) VALUES (:f, :s, :h)"),
+        {"f": file_name, "s": sheet, "h": content_hash},
+    )
+
+
+# ─── Sheet diff ──────────────────────────────────────────────────────────────
+
+@dataclass
+class SheetDiff:
+    inserts: List[str] = field(default_factory=list)                 # family numbers
+    updates: List[str] = field(default_factory=list)
+    deletes: List[Tuple[str, Optional[int]]] = field(default_factory=list)  # (family number, member id)
+    unchanged: int = 0
+    adopted: int = 0
+    relinked: int = 0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes)
+
+
+def manifest_empty(db: Session) -> bool:
+    """True before anything was imported with the manifest: the legacy first run."""
+    return db.execute(text("SELECT 1 FROM import_members LIMIT 1")).first() is None
+
+
+def previous_members(db: Session, file_name: str) -> Dict[str, Tuple[Optional[int], str]]:
+    """family number → (member id, record hash); the id is None if the member was deleted since."""
+    rows = db.execute(
+        text("""
+            SELECT m.family_number, f.id, m.record_hash
+            FROM import_members m LEFT JOIN family_members f ON f.id = m.member_id
+            WHERE m.file_name = :f
+        """),
+        {"f": file_name},
+    )
+    return {fnum: (mid, h) for fnum, mid, h in rows}
+
+
+def remember_members(db: Session, file_name: str, rows: Iterable[Tuple[str, int, str]]) -> None:
+    """Upsert (family number, member id, record hash) rows for `file_name`."""
+    db.execute(
+        text("INSERT OR REPLACE INTO import_members (file_name, family_number, member_id, record_hash) "
+             "VALUES (:f, :n, :m, :h)"),
+        [{"f": file_name, "n": fnum, "m": mid, "h": h} for fnum, mid, h in rows],
+    )
+
+
+def forget_members(db: Session, file_name: str, family_numbers: Iterable[str]) -> None:
+    db.execute(
+        text("DELETE FROM import_members WHERE file_name = :f AND family_number = :n"),
+        [{"f": file_name, "n": fnum} for fnum in family_numbers],
+    )
+
+
+def adopt_members(db: Session, people: List[Tuple[str, Dict]]) -> Dict[str, Tuple[int, Optional[str]]]:
+    """
+    Claim members imported before the manifest existed. The old importer
+    inserted a sheet's people in sheet order, so the branch's unclaimed
+    members in id order are aligned with `people` ((family number, person)
+    in sheet order) by name; where a number repeats, the last row wins, as
+    it did for parent links then. The hash is None, so every adopted record
+    is rewritten and relinked.
+    """
+    branches = {p["branch_name"] for _, p in people}
+    rows = []
+    for branch in branches:
+        rows += db.execute(
+            text("""
+                SELECT id, full_name, branch_name FROM family_members
+                WHERE branch_name = :b AND id NOT IN (SELECT member_id FROM import_members)
+            """),
+            {"b": branch},
+        ).fetchall()
+    rows.sort()
+    matcher = SequenceMatcher(None, [(name, branch) for _, name, branch in rows],
+                              [(p["full_name"], p["branch_name"]) for _, p in people], autojunk=False)
+    adopted = {}
+    for i, j, size in matcher.get_matching_blocks():
+        for k in range(size):
+            adopted[people[j + k][0]] = (rows[i + k][0], None)
+    return adopted
+
+
+def diff_sheet(previous: Dict[str, Tuple[Optional[int], Optional[str]]], records: Dict[str, Dict]) -> SheetDiff:
+    """
+    Compare a sheet's records (normalized family number → person) with what
+    was imported from it last time. Members deleted through the API since
+    count as unchanged while their row is still there, and are only
+    forgotten once the row goes.
+    """
+    diff = SheetDiff()
+    for fnum, person in records.items():
+        prev = previous.get(fnum)
+        if prev is None:
+            diff.inserts.append(fnum)
+        elif prev[0] is not None and prev[1] != record_hash(person):
+            diff.updates.append(fnum)
+        else:
+            diff.unchanged += 1
+    diff.deletes = [(fnum, mid) for fnum, (mid, _) in previous.items() if fnum not in records]
+    return diff
@@ -0,0 +1,167 @@
+"""
+Integrity of the parent_id graph.
+
+Every member has at most one parent, so the family is a set of parent
+pointers and one pass over them classifies everything in O(V+E):
+
+  cycles       members whose parent chain comes back to themselves
+  dangling     members whose parent_id names nobody (their branch is orphaned)
+  unreachable  members hanging below a cycle — no top of branch above them
+  bad_paths    path/depth (lineage.py) that disagree with parent_id
+
+The read side copes with all of these (TreeIndex walks are cycle-safe), but
+they are still data errors. The write endpoints keep them out with
+creates_cycle(), a walk up from the new parent that costs O(depth); the
+importers write around the API, so audit the whole table after a run:
+
+    python integrity.py audit [--json]     # exit status 1 if anything is wrong
+
+Path mismatches are repaired with `python lineage.py rebuild`; cycles and
+dangling parents need a decision about where those members belong.
+"""
+import sys
+import json
+import time
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from lineage import path_for
+
+OK, ORPHAN, CYCLE, BELOW_CYCLE = "ok", "orphan", "cycle", "below_cycle"
+
+
+@dataclass
+class IntegrityReport:
+    members: int = 0
+    cycles: List[List[int]] = field(default_factory=list)
+    dangling: List[int] = field(default_factory=list)
+    orphaned: int = 0                                      # members in branches under a dangling parent
+    unreachable: List[int] = field(default_factory=list)
+    bad_paths: List[int] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not (self.cycles or self.dangling or self.unreachable or self.bad_paths)
+
+
+def creates_cycle(db, member_id: int, new_parent_id: Optional[int]) -> bool:
+    """
+    True if hanging `member_id` under `new_parent_id` would close a loop,
+    i.e. the new parent is the member itself or one of its descendants.
+    Walks up parent_id (not path, which an importer may have left stale);
+    UNION stops the walk on a cycle already in the data. db: Session or Connection.
+    """
+    if new_parent_id is None:
+        return False
+    return db.execute(
+        text("""
+            WITH RECURSIVE up(id, parent_id) AS (
+                SELECT id, parent_id FROM family_members WHERE id = :parent
+                UNION
+                SELECT f.id, f.parent_id FROM family_members f JOIN up ON f.id = up.parent_id
+            )
+            SELECT 1 FROM up WHERE id = :member LIMIT 1
+        """),
+        {"parent": new_parent_id, "member": member_id},
+    ).first() is not None
+
+
+def check(rows: Iterable[tuple]) -> IntegrityReport:
+    """
+    Classify every member from (id, parent_id, path, depth) rows. Each
+    member joins exactly one upward walk, which stops at a root, a dangling
+    parent, a member already classified, or its own trail (a cycle).
+    Expected paths follow lineage.rebuild_paths: a member with a dangling
+    parent starts its own branch.
+    """
+    parent: Dict[int, Optional[int]] = {}
+    stored: Dict[int, tuple] = {}
+    for mid, pid, path, depth in rows:
+        parent[mid] = pid
+        stored[mid] = (path, depth)
+    report = IntegrityReport(members=len(parent))
+
+    status: Dict[int, str] = {}
+    expected: Dict[int, tuple] = {}      # id → (path, depth) implied by parent_id
+    for start in parent:
+        if start in status:
+            continue
+        trail: List[int] = []
+        on_trail: Dict[int, int] = {}
+        node = start
+        while True:
+            if node in status:
+                tail, top = status[node], expected.get(node)
+                break
+            if node in on_trail:
+                cycle = trail[on_trail[node]:]
+                report.cycles.append(cycle)
+                for mid in cycle:
+                    status[mid] = CYCLE
+                trail = trail[:on_trail[node]]
+                tail, top = CYCLE, None
+                break
+            on_trail[node] = len(trail)
+            trail.append(node)
+            pid = parent[node]
+            if pid is None:
+                tail, top = OK, None
+                break
+            if pid not in parent:
+                report.dangling.append(node)
+                tail, top = ORPHAN, None
+                break
+            node = pid
+
+        label = BELOW_CYCLE if tail in (CYCLE, BELOW_CYCLE) else tail
+        for mid in reversed(trail):          # top of the walk first
+            status[mid] = label
+            if label == BELOW_CYCLE:
+                report.unreachable.append(mid)
+                continue
+            top = expected[mid] = (path_for(top[0] if top else None, mid), top[1] + 1 if top else 0)
+            if stored[mid] != top:
+                report.bad_paths.append(mid)
+            if label == ORPHAN:
+                report.orphaned += 1
+    return report
+
+
+def audit(conn) -> IntegrityReport:
+    """Full-table check; conn: Session or Connection."""
+    rows = conn.execute(text("SELECT id, parent_id, path, depth FROM family_members"))
+    return check(rows)
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    args = sys.argv[1:]
+    if args not in (["audit"], ["audit", "--json"]):
+        sys.exit("usage: python integrity.py audit [--json]")
+    t0 = time.perf_counter()
+    with engine.connect() as conn:
+        report = audit(conn)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if "--json" in args:
+        print(json.dumps({**asdict(report), "ok": report.ok, "ms": round(elapsed, 1)}, ensure_ascii=False))
+    else:
+        for cycle in report.cycles:
+            logging.warning("cycle: %s", " → ".join(map(str, cycle + cycle[:1])))
+        if report.dangling:
+            logging.warning("%d member(s) with a missing parent, %d member(s) in those branches: %s",
+                            len(report.dangling), report.orphaned, report.dangling[:20])
+        if report.unreachable:
+            logging.warning("%d member(s) below a cycle: %s", len(report.unreachable), report.unreachable[:20])
+        if report.bad_paths:
+            logging.warning("%d path/depth mismatch(es) — run `python lineage.py rebuild`: %s",
+                            len(report.bad_paths), report.bad_paths[:20])
+        if report.ok:
+            logging.info("✅ %d members, no problems (%.0f ms)", report.members, elapsed)
+        else:
+            logging.info("%d members checked (%.0f ms)", report.members, elapsed)
+    sys.exit(0 if report.ok else 1)
@@ -0,0 +1,161 @@
+"""
+Materialized-path encoding of the family tree.
+
+Every member carries `path` — the ids from the top of its branch down to
+itself, e.g. '/1/5/23/' — and `depth` (roots = 0). Reads are served from
+the in-memory TreeIndex; what the encoding buys is on the write side:
+moving or lifting a whole subtree is one UPDATE over a range of the
+indexed `path` column:  path > '/1/5/'  AND  path < '/1/50'
+('/' sorts right before '0', so the upper bound closes the prefix).
+integrity.py checks it against parent_id. The encoding itself is in
+path_encoding.py, which needs nothing outside the standard library.
+
+The columns come from migration 2 (migrations.py). The import scripts
+rebuild the encoding in their own transaction; any other writer that goes
+around the API leaves `path` NULL. backfill_paths() notices that at
+startup, ensure_paths() before a write rewrites paths in a running API,
+and `python lineage.py rebuild` does the same by hand.
+
+    python lineage.py rebuild
+"""
+import sys
+import logging
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from models import FamilyMember
+from path_encoding import compute_paths, path_for, subtree_upper
+
+
+# ─── Maintenance ─────────────────────────────────────────────────────────────
+
+def ensure_paths(db: Session, *members: Optional[FamilyMember]) -> None:
+    """
+    Rebuild the encoding in the session's transaction if any row has no
+    path (an importer wrote around the API since startup), then reload
+    path/depth on `members`. Every rewrite below starts from stored paths,
+    so it calls this first.
+    """
+    if db.execute(text("SELECT 1 FROM family_members WHERE path IS NULL LIMIT 1")).first() is None:
+        return
+    db.flush()
+    n = rebuild_paths(db.connection())
+    logging.info("lineage: rebuilt path/depth for %d members", n)
+    for m in members:
+        if m is not None:
+            db.refresh(m, ["path", "depth"])
+
+
+def assign_path(db: Session, member: FamilyMember) -> None:
+    """Set path/depth on a freshly flushed member from its parent."""
+    parent = db.get(FamilyMember, member.parent_id) if member.parent_id else None
+    if parent is not None and parent.path is None:
+        ensure_paths(db, parent)
+    if parent is not None:
+        member.path, member.depth = path_for(parent.path, member.id), parent.depth + 1
+    else:
+        member.path, member.depth = path_for(None, member.id), 0
+
+
+def move_subtree(db: Session, member: FamilyMember, new_parent: Optional[FamilyMember]) -> None:
+    """
+    Re-root the subtree under `member` below `new_parent` (None → make it a
+    root) with one UPDATE. The caller sets parent_id and rejects cycles
+    (integrity.creates_cycle).
+    """
+    ensure_paths(db, member, new_parent)
+    old_path = member.path
+    new_path = path_for(new_parent.path if new_parent is not None else None, member.id)
+    new_depth = new_parent.depth + 1 if new_parent is not None else 0
+    if old_path == new_path:
+        return
+    db.execute(
+        text("""
+            UPDATE family_members
+            SET path  = :new_path || substr(path, :cut),
+                depth = depth + :delta
+            WHERE path >= :old_path AND path < :upper
+        """),
+        {"new_path": new_path, "cut": len(old_path) + 1, "delta": new_depth - member.depth,
+         "old_path": old_path, "upper": subtree_upper(old_path)},
+    )
+    db.expire(member, ["path", "depth"])
+
+
+def lift_children(db: Session, member: FamilyMember) -> None:
+    """Drop `member`'s segment from every descendant path, ahead of deleting it."""
+    ensure_paths(db, member)
+    parent_path = member.path[: member.path.rstrip("/").rfind("/") + 1]
+    db.execute(
+        text("""
+            UPDATE family_members
+            SET path  = :parent_path || substr(path, :cut),
+                depth = depth - 1
+            WHERE path > :old_path AND path < :upper
+        """),
+        {"parent_path": parent_path, "cut": len(member.path) + 1,
+         "old_path": member.path, "upper": subtree_upper(member.path)},
+    )
+
+
+def adopt_children(db: Session, member: FamilyMember, new_parent: FamilyMember) -> List[int]:
+    """
+    Hand every child of `member`, with its whole subtree, to `new_parent`:
+    one UPDATE for the paths below `member`, one for the parent_ids. The
+    caller rejects a `new_parent` inside the subtree. Returns the child ids.
+    """
+    ensure_paths(db, member, new_parent)
+    child_ids = [mid for (mid,) in db.execute(
+        text("SELECT id FROM family_members WHERE parent_id = :id"), {"id": member.id})]
+    if not child_ids:
+        return child_ids
+    db.execute(
+        text("""
+            UPDATE family_members
+            SET path  = :new_prefix || substr(path, :cut),
+                depth = depth + :delta
+            WHERE path > :old_path AND path < :upper
+        """),
+        {"new_prefix": new_parent.path, "cut": len(member.path) + 1, "delta": new_parent.depth - member.depth,
+         "old_path": member.path, "upper": subtree_upper(member.path)},
+    )
+    db.execute(
+        text("UPDATE family_members SET parent_id = :new WHERE parent_id = :old"),
+        {"new": new_parent.id, "old": member.id},
+    )
+    return child_ids
+
+
+def rebuild_paths(conn: Connection) -> int:
+    """Recompute path/depth for the whole table from parent_id. Returns rows written."""
+    encoded = compute_paths(conn.execute(text("SELECT id, parent_id FROM family_members")))
+    if encoded:
+        conn.execute(
+            text("UPDATE family_members SET path = :path, depth = :depth WHERE id = :id"),
+            [{"id": mid, "path": path, "depth": depth} for mid, (path, depth) in encoded.items()],
+        )
+    return len(encoded)
+
+
+def backfill_paths(engine: Engine) -> None:
+    """Rebuild the encoding if anything was written without a path."""
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT 1 FROM family_members WHERE path IS NULL LIMIT 1")).first():
+            n = rebuild_paths(conn)
+            logging.info("lineage: rebuilt path/depth for %d members", n)
+
+
+if __name__ == "__main__":
+    from db import engine
+    from migrations import upgrade
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python lineage.py rebuild")
+    upgrade(engine)
+    with engine.begin() as conn:
+        n = rebuild_paths(conn)
+    logging.info("✅ path/depth rebuilt for %d members", n)
@@ -1,30 +1,49 @@
 import os
-import uuid
-import shutil
+import json
+import base64
+import time
+import logging
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
-from fastapi import FastAPI, HTTPException, Query, Depends, Security, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, Depends, Request, Response, BackgroundTasks
+from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
-from sqlalchemy import text, func
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from dotenv import load_dotenv
-from jose import JWTError, jwt
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from db import Base, engine, get_db
+from db import engine, async_engine, get_db, get_async_db, SessionLocal, READ_ONLY
 from models import FamilyMember
+from tree_index import TreeIndex, tree_index, member_to_dict, row_to_dict, MEMBER_COLUMNS, SNAPSHOT_PATH
+from serialize import json_response, ndjson_line
+from photos import (
+    UPLOADS_DIR, THUMB_SIZES, receive_photo, discard, store, release, upload_path, is_immutable, is_photo_name,
+    make_thumbnails, thumb_path,
+)
+from cache import NotModified, read_db_id, read_version, bump_version, check_not_modified
+from migrations import upgrade, current_version, latest_version
+import lineage
+from integrity import creates_cycle
 from schemas import (
-    SearchResult, FamilyMemberDetail, LineageResponse,
-    FamilyMemberCreate, FamilyMemberUpdate,
+    SearchResult, FamilyMemberDetail, LineageResponse, SubtreeNode, Suggestion,
+    FamilyMemberCreate, FamilyMemberUpdate, BatchCreateRequest, BatchUpdateRequest, BatchCreateResponse,
+    MoveRequest, MergeRequest,
     LoginRequest, TokenResponse, StatsResponse,
 )
 
-load_dotenv()
-
-Base.metadata.create_all(bind=engine)
+if not READ_ONLY:
+    upgrade(engine)
+else:
+    # No schema work on a frozen file — it has to ship already migrated
+    with engine.connect() as _conn:
+        if current_version(_conn) < latest_version():
+            logging.error("READ_ONLY database is at schema %d, code expects %d — run `python migrations.py freeze`",
+                          current_version(_conn), latest_version())
 
 # ── Config ────────────────────────────────────────────────────────────────────
 ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
@@ -34,7 +53,11 @@ JWT_ALGORITHM  = "HS256"
 JWT_EXPIRE_H   = 12
 
 # ── Token helpers ─────────────────────────────────────────────────────────────
+# python-jose (and cryptography behind it) is imported on first use: only
+# /login and the admin endpoints need it, not the public reads a cold start serves.
 def create_token(data: dict) -> str:
+    from jose import jwt
+
     payload = data.copy()
     payload["exp"] = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRE_H)
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
@@ -43,6 +66,8 @@ def create_token(data: dict) -> str:
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login", auto_error=False)
 
 def get_current_admin(token: str = Depends(oauth2_scheme)):
+    from jose import JWTError, jwt
+
     if not token:
         raise HTTPException(status_code=401, detail="غير مسموح — سجّل دخول أولاً")
     try:
@@ -53,10 +78,37 @@ def get_current_admin(token: str = Depends(oauth2_scheme)):
         raise HTTPException(status_code=401, detail="توكن غير صالح")
 
 
+# ── Warm-up ───────────────────────────────────────────────────────────────────
+def warm_up() -> dict:
+    """
+    Get the process ready to serve: open a pooled connection and build the
+    tree index, from the prebuilt snapshot when one matches the database.
+    Cheap to call again once warm.
+    """
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        version = read_version(db)[0]
+        source = "memory"
+        if not tree_index.loaded or tree_index.version != version:
+            source = "db"
+            if tree_index.load_snapshot(read_db_id(db), version, SNAPSHOT_PATH):
+                source = "snapshot"
+            tree_index.ensure_current(db, version)  # rebuilds unless the snapshot was current
+    return {"source": source, "members": len(tree_index.members), "version": version,
+            "read_only": READ_ONLY, "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
 # ── App ───────────────────────────────────────────────────────────────────────
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up()
+    yield
+
+
 app = FastAPI(
     title="Family Tree API",
     docs_url=None, redoc_url=None, openapi_url=None,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -65,24 +117,56 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# On Vercel the task filesystem is read-only; use /tmp for writable storage
-if os.getenv("VERCEL") or not os.access(Path(__file__).resolve().parent, os.W_OK):
-    UPLOADS_DIR = Path("/tmp/uploads")
-else:
-    UPLOADS_DIR = Path(__file__).resolve().parent / "uploads"
 
-UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+@app.exception_handler(NotModified)
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers=exc.headers)
 
-# Only mount static files if the directory is accessible
-try:
-    app.mount("/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
-except Exception:
-    pass  # If /tmp/uploads is empty, StaticFiles may fail — ignore on cold start
+
+@app.middleware("http")
+async def add_cache_validators(request: Request, call_next):
+    """Stamp ETag / Last-Modified computed by get_data_version onto fresh 200s."""
+    response = await call_next(request)
+    headers = getattr(request.state, "cache_headers", None)
+    if headers and response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+if not READ_ONLY:
+    UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def file_response(request: Request, path: Path, headers: Optional[dict] = None) -> Response:
+    """FileResponse, or a bare 304 when the client's If-None-Match already has it."""
+    response = FileResponse(path, stat_result=path.stat(), headers=headers)
+    etag = response.headers["etag"]
+    inm = request.headers.get("if-none-match")
+    if inm and etag in {t.strip().removeprefix("W/") for t in inm.split(",")}:
+        return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+    return response
+
+
+@app.get("/uploads/{filename}", include_in_schema=False)
+def get_upload(filename: str, request: Request):
+    """Uploaded photos — a plain route instead of a StaticFiles mount."""
+    path = UPLOADS_DIR / filename
+    if not is_photo_name(filename) or not path.is_file():  # temp files, thumbs/, anything else: not served
+        raise HTTPException(status_code=404, detail="الصورة غير موجودة")
+    headers = {"Cache-Control": f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"} if is_immutable(filename) else None
+    return file_response(request, path, headers)
 
 
 # ── Helper ────────────────────────────────────────────────────────────────────
+def require_writable():
+    if READ_ONLY:
+        raise HTTPException(status_code=503, detail="الموقع في وضع القراءة فقط — التعديل غير متاح حالياً")
+
+
 def get_member_or_404(db: Session, member_id: int) -> FamilyMember:
     m = db.query(FamilyMember).filter(FamilyMember.id == member_id).first()
     if not m:
@@ -90,27 +174,98 @@ def get_member_or_404(db: Session, member_id: int) -> FamilyMember:
     return m
 
 
-def get_lineage(db: Session, member_id: int):
-    query = text("""
-        WITH RECURSIVE ancestors(id, full_name, branch_name, parent_id,
-                                 image_url, gender, birth_year, death_year,
-                                 email, phone, is_alive) AS (
-            SELECT id, full_name, branch_name, parent_id,
-                   image_url, gender, birth_year, death_year,
-                   email, phone, is_alive
-            FROM family_members
-            WHERE id = :member_id
-            UNION ALL
-            SELECT fm.id, fm.full_name, fm.branch_name, fm.parent_id,
-                   fm.image_url, fm.gender, fm.birth_year, fm.death_year,
-                   fm.email, fm.phone, fm.is_alive
-            FROM family_members fm
-            JOIN ancestors a ON fm.id = a.parent_id
-        )
-        SELECT * FROM ancestors
-    """)
-    rows = db.execute(query, {"member_id": member_id}).fetchall()
-    return list(reversed(rows))
+async def get_data_version(request: Request) -> int:
+    """
+    Current data version. For GETs this is also the conditional-request
+    check: a matching If-None-Match / If-Modified-Since ends the request
+    with 304 before the endpoint does any work. Uses its own short-lived
+    connection, so index-served reads never hold one for the whole request.
+    """
+    async with async_engine.connect() as conn:
+        version, updated_at = await conn.run_sync(read_version)
+    if request.method == "GET":
+        request.state.cache_headers = check_not_modified(request, version, updated_at)
+    return version
+
+
+def _reload_index(version: int) -> None:
+    with SessionLocal() as db:
+        tree_index.ensure_current(db, version)
+
+
+async def get_index(version: int = Depends(get_data_version)) -> TreeIndex:
+    """
+    The in-memory family graph, reloaded if another process wrote since it
+    was built. Only the version read is async: a rebuild (or waiting for a
+    write to finish patching) blocks, so it runs in the threadpool, where
+    the index lock also keeps concurrent requests to one rebuild.
+    """
+    if not tree_index.loaded or tree_index.version != version:
+        await run_in_threadpool(_reload_index, version)
+    return tree_index
+
+
+@contextmanager
+def commit_write(db: Session, index: TreeIndex) -> Iterator[bool]:
+    """
+    Bump the data version and commit; the block patches the index. Yields
+    True if the caller should patch it with its change (False: the index
+    was stale and will reload). Reads that already see the new version
+    wait for the block in the threadpool, so it is never served with the
+    old data; the event loop is not held up.
+    """
+    old, new = bump_version(db)
+    db.commit()
+    with index.advance(old, new) as synced:
+        yield synced
+
+
+def get_indexed_or_404(index: TreeIndex, member_id: int) -> dict:
+    m = index.get(member_id)
+    if not m:
+        raise HTTPException(status_code=404, detail=f"الشخص رقم {member_id} غير موجود")
+    return m
+
+
+SUBTREE_MAX_DEPTH = 64
+MEMBERS_PAGE_SIZE = 500
+
+
+# ── Keyset cursor over (full_name, id) ────────────────────────────────────────
+def encode_cursor(full_name: str, member_id: int) -> str:
+    raw = json.dumps([full_name, member_id], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        full_name, member_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(full_name), int(member_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="مؤشر الصفحة غير صالح")
+
+
+def members_page_query(after: Optional[tuple], limit: Optional[int]):
+    """Members ordered by (full_name, id), strictly after `after` — walks ix_family_members_full_name."""
+    sql = f"SELECT {', '.join(MEMBER_COLUMNS)} FROM family_members"
+    params = {}
+    if after is not None:
+        sql += " WHERE (full_name, id) > (:after_name, :after_id)"
+        params = {"after_name": after[0], "after_id": after[1]}
+    sql += " ORDER BY full_name, id"
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return text(sql), params
+
+
+async def stream_members_ndjson(after: Optional[tuple], limit: Optional[int]):
+    """One JSON object per line, read straight off a server-side cursor."""
+    query, params = members_page_query(after, limit)
+    async with async_engine.connect() as conn:
+        result = await conn.stream(query, params, execution_options={"yield_per": 1000})
+        async for row in result:
+            yield ndjson_line(row_to_dict(row))
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -125,30 +280,23 @@ def login(payload: LoginRequest):
     return TokenResponse(access_token=token)
 
 
+# ═══════════════════════════════════════════════════════════════════════════════
+#  WARM-UP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+@app.get("/warmup")
+def warmup():
+    """Cold-start hook: builds the index now so the next real request doesn't pay for it."""
+    return json_response(warm_up(), headers={"Cache-Control": "no-store"})
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #  STATS
 # ═══════════════════════════════════════════════════════════════════════════════
 
 @app.get("/stats", response_model=StatsResponse)
-def get_stats(db: Session = Depends(get_db)):
-    total   = db.query(func.count(FamilyMember.id)).scalar() or 0
-    living  = db.query(func.count(FamilyMember.id)).filter(FamilyMember.is_alive == True).scalar() or 0
-    deceased = total - living
-
-    # Estimate generations by counting max depth via recursive CTE
-    gen_query = text("""
-        WITH RECURSIVE gen(id, depth) AS (
-            SELECT id, 1 FROM family_members WHERE parent_id IS NULL
-            UNION ALL
-            SELECT fm.id, g.depth + 1
-            FROM family_members fm
-            JOIN gen g ON fm.parent_id = g.id
-        )
-        SELECT COALESCE(MAX(depth), 0) FROM gen
-    """)
-    generations = db.execute(gen_query).scalar() or 0
-
-    return StatsResponse(total=total, living=living, deceased=deceased, generations=generations)
+async def get_stats(index: TreeIndex = Depends(get_index)):
+    return json_response(index.stats())
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -156,145 +304,348 @@ def get_stats(db: Session = Depends(get_db)):
 # ═══════════════════════════════════════════════════════════════════════════════
 
 @app.get("/search", response_model=List[SearchResult])
-def search_members(q: str = Query(..., min_length=1), limit: int = 20, db: Session = Depends(get_db)):
-    members = (
-        db.query(FamilyMember)
-        .filter(FamilyMember.full_name.contains(q))
-        .limit(limit)
-        .all()
-    )
-    return [SearchResult.model_validate(m) for m in members]
+async def search_members(q: str = Query(..., min_length=1), limit: int = 20, index: TreeIndex = Depends(get_index)):
+    """Ranked name search; spelling variants (hamza, taa marbuta, tashkeel, spacing) match."""
+    return json_response(index.search_names(q, limit))
+
+
+@app.get("/suggest", response_model=List[Suggestion])
+async def suggest_members(
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(8, ge=1, le=50),
+    index: TreeIndex = Depends(get_index),
+):
+    """Type-ahead: names starting with `prefix`, with father/grandfather for disambiguation."""
+    return json_response(index.suggest(prefix, limit))
 
 
 @app.get("/members", response_model=List[SearchResult])
-def list_members(limit: int = 500, db: Session = Depends(get_db)):
-    members = (
-        db.query(FamilyMember)
-        .order_by(FamilyMember.full_name.asc())
-        .limit(limit)
-        .all()
-    )
-    return [SearchResult.model_validate(m) for m in members]
+async def list_members(
+    limit: Optional[int] = Query(None, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_db),
+    _version: int = Depends(get_data_version),
+):
+    """
+    Alphabetical listing, paged by keyset. Pass the X-Next-Cursor header of
+    one page as `cursor` to get the next. format=ndjson streams every member
+    from `cursor` on (or `limit` of them) without building the list in memory.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    if format == "ndjson":
+        return StreamingResponse(stream_members_ndjson(after, limit), media_type="application/x-ndjson")
+
+    limit = limit or MEMBERS_PAGE_SIZE
+    query, params = members_page_query(after, limit + 1)
+    rows = (await db.execute(query, params)).fetchall()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1][1], rows[-1][0])
+    return json_response([row_to_dict(r) for r in rows], headers=headers)
 
 
 @app.get("/person/{member_id}", response_model=LineageResponse)
-def get_person(member_id: int, db: Session = Depends(get_db)):
-    person = get_member_or_404(db, member_id)
-    lineage_rows = get_lineage(db, member_id)
-
-    def row_to_schema(row):
-        return SearchResult(
-            id=row[0], full_name=row[1], branch_name=row[2], parent_id=row[3],
-            image_url=row[4], gender=row[5], birth_year=row[6], death_year=row[7],
-            email=row[8], phone=row[9], is_alive=bool(row[10]) if row[10] is not None else True,
-        )
-
-    return LineageResponse(
-        person=FamilyMemberDetail.model_validate(person),
-        lineage=[row_to_schema(r) for r in lineage_rows],
-    )
+async def get_person(member_id: int, index: TreeIndex = Depends(get_index)):
+    person = get_indexed_or_404(index, member_id)
+    return json_response({"person": person, "lineage": index.lineage(member_id)})
 
 
 @app.get("/children/{member_id}", response_model=List[SearchResult])
-def get_children(member_id: int, db: Session = Depends(get_db)):
-    get_member_or_404(db, member_id)
-    children = (
-        db.query(FamilyMember)
-        .filter(FamilyMember.parent_id == member_id)
-        .order_by(FamilyMember.full_name)
-        .all()
-    )
-    return [SearchResult.model_validate(c) for c in children]
+async def get_children(member_id: int, index: TreeIndex = Depends(get_index)):
+    get_indexed_or_404(index, member_id)
+    return json_response(index.children_of(member_id))
+
+
+@app.get("/subtree/{member_id}", response_model=SubtreeNode)
+async def get_member_subtree(
+    member_id: int,
+    depth: int = Query(SUBTREE_MAX_DEPTH, ge=0, le=SUBTREE_MAX_DEPTH),
+    index: TreeIndex = Depends(get_index),
+):
+    """Whole branch under a member in one response — replaces per-node /children calls."""
+    get_indexed_or_404(index, member_id)
+    return json_response(index.subtree(member_id, depth))
 
 
 @app.get("/roots", response_model=List[SearchResult])
-def get_roots(limit: int = 20, db: Session = Depends(get_db)):
-    roots = (
-        db.query(FamilyMember)
-        .filter(FamilyMember.parent_id == None)
-        .order_by(FamilyMember.full_name)
-        .limit(limit)
-        .all()
-    )
-    return [SearchResult.model_validate(r) for r in roots]
+async def get_roots(limit: int = 20, index: TreeIndex = Depends(get_index)):
+    return json_response(index.roots_list(limit))
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 #  WRITE ENDPOINTS (admin only)
 # ═══════════════════════════════════════════════════════════════════════════════
 
-@app.post("/members", response_model=FamilyMemberDetail)
-def create_member(payload: FamilyMemberCreate, db: Session = Depends(get_db)):
+@app.post("/members", response_model=FamilyMemberDetail, dependencies=[Depends(require_writable)])
+def create_member(payload: FamilyMemberCreate, db: Session = Depends(get_db),
+                  index: TreeIndex = Depends(get_index)):
     """Public — anyone can add a family member."""
+    if payload.parent_id is not None:
+        get_member_or_404(db, payload.parent_id)
     member = FamilyMember(**payload.model_dump())
     db.add(member)
-    db.commit()
-    db.refresh(member)
+    db.flush()
+    lineage.assign_path(db, member)
+    with commit_write(db, index) as synced:
+        db.refresh(member)
+        if synced:
+            index.add(member_to_dict(member))
     return FamilyMemberDetail.model_validate(member)
 
 
-@app.put("/members/{member_id}", response_model=FamilyMemberDetail, dependencies=[Depends(get_current_admin)])
-def update_member(member_id: int, payload: FamilyMemberUpdate, db: Session = Depends(get_db)):
-    member = get_member_or_404(db, member_id)
-    update_data = payload.model_dump(exclude_unset=True)
+def _apply_update(db: Session, member: FamilyMember, update_data: dict) -> None:
+    if "parent_id" in update_data and update_data["parent_id"] != member.parent_id:
+        # An earlier move in the same transaction may have rewritten paths the
+        # session still holds; write pending changes and re-read them.
+        db.flush()
+        db.expire_all()
+        new_parent = get_member_or_404(db, update_data["parent_id"]) if update_data["parent_id"] is not None else None
+        if creates_cycle(db, member.id, update_data["parent_id"]):
+            raise HTTPException(status_code=400, detail="لا يمكن نقل الشخص تحت أحد أحفاده")
+        lineage.move_subtree(db, member, new_parent)
     for field, value in update_data.items():
         setattr(member, field, value)
-    db.commit()
-    db.refresh(member)
+
+
+def _reload(db: Session, ids: List[int]) -> List[FamilyMember]:
+    """Committed members in `ids` order, refreshed with one SELECT."""
+    rows = {m.id: m for m in db.query(FamilyMember).filter(FamilyMember.id.in_(ids))}
+    return [rows[mid] for mid in ids]
+
+
+@app.post("/members/batch", response_model=BatchCreateResponse, dependencies=[Depends(require_writable)])
+def create_members_batch(payload: BatchCreateRequest, db: Session = Depends(get_db),
+                         index: TreeIndex = Depends(get_index)):
+    """
+    Public — add several members at once (a whole household) in a single
+    transaction: all of them or none. An entry can hang under an earlier
+    entry of the same batch with `parent_ref` = that entry's `ref`; the
+    response maps every ref to the id it got.
+    """
+    refs: set = set()
+    for n, item in enumerate(payload.members, 1):
+        if item.parent_ref is not None:
+            if item.parent_id is not None:
+                raise HTTPException(status_code=400, detail=f"العنصر {n}: حدد parent_id أو parent_ref وليس كليهما")
+            if item.parent_ref not in refs:
+                raise HTTPException(status_code=400, detail=f"العنصر {n}: المرجع «{item.parent_ref}» غير معرّف في عنصر سابق")
+        if item.ref is not None:
+            if item.ref in refs:
+                raise HTTPException(status_code=400, detail=f"العنصر {n}: المرجع «{item.ref}» مكرر")
+            refs.add(item.ref)
+
+    # Load the outside parents once; assign_path then finds them in the session
+    parent_ids = {item.parent_id for item in payload.members if item.parent_id}
+    found = {m.id for m in db.query(FamilyMember).filter(FamilyMember.id.in_(parent_ids))} if parent_ids else set()
+    missing = sorted(parent_ids - found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"الشخص رقم {missing[0]} غير موجود")
+
+    ids, ref_ids = [], {}
+    for item in payload.members:
+        data = item.model_dump(exclude={"ref", "parent_ref"})
+        if item.parent_ref is not None:
+            data["parent_id"] = ref_ids[item.parent_ref]
+        member = FamilyMember(**data)
+        db.add(member)
+        db.flush()
+        lineage.assign_path(db, member)
+        ids.append(member.id)
+        if item.ref is not None:
+            ref_ids[item.ref] = member.id
+    with commit_write(db, index) as synced:
+        members = _reload(db, ids)
+        if synced:
+            for member in members:
+                index.add(member_to_dict(member))
+    return BatchCreateResponse(members=[FamilyMemberDetail.model_validate(m) for m in members], refs=ref_ids)
+
+
+@app.patch("/members/batch", response_model=List[FamilyMemberDetail],
+           dependencies=[Depends(require_writable), Depends(get_current_admin)])
+def update_members_batch(payload: BatchUpdateRequest, db: Session = Depends(get_db),
+                         index: TreeIndex = Depends(get_index)):
+    """
+    Admin — apply several updates, in the order given, in a single
+    transaction. Same rules as PUT /members/{id}; one bad entry rejects all.
+    """
+    ids = [item.id for item in payload.members]
+    seen: set = set()
+    for mid in ids:
+        if mid in seen:
+            raise HTTPException(status_code=400, detail=f"الشخص رقم {mid} مكرر في الدفعة")
+        seen.add(mid)
+    members = {m.id: m for m in db.query(FamilyMember).filter(FamilyMember.id.in_(ids))}
+    for mid in ids:
+        if mid not in members:
+            raise HTTPException(status_code=404, detail=f"الشخص رقم {mid} غير موجود")
+    for item in payload.members:
+        _apply_update(db, members[item.id], item.model_dump(exclude_unset=True, exclude={"id"}))
+    with commit_write(db, index) as synced:
+        updated = _reload(db, ids)
+        if synced:
+            for member in updated:
+                index.update(member_to_dict(member))
+    return [FamilyMemberDetail.model_validate(m) for m in updated]
+
+
+@app.put("/members/{member_id}", response_model=FamilyMemberDetail,
+         dependencies=[Depends(require_writable), Depends(get_current_admin)])
+def update_member(member_id: int, payload: FamilyMemberUpdate, db: Session = Depends(get_db),
+                  index: TreeIndex = Depends(get_index)):
+    member = get_member_or_404(db, member_id)
+    _apply_update(db, member, payload.model_dump(exclude_unset=True))
+    with commit_write(db, index) as synced:
+        db.refresh(member)
+        if synced:
+            index.update(member_to_dict(member))
     return FamilyMemberDetail.model_validate(member)
 
 
-@app.delete("/members/{member_id}", dependencies=[Depends(get_current_admin)])
-def delete_member(member_id: int, db: Session = Depends(get_db)):
+@app.delete("/members/{member_id}", dependencies=[Depends(require_writable), Depends(get_current_admin)])
+def delete_member(member_id: int, db: Session = Depends(get_db),
+                  index: TreeIndex = Depends(get_index)):
     member = get_member_or_404(db, member_id)
+    image_url = member.image_url
     # Re-parent children to their grandparent
+    lineage.lift_children(db, member)
     db.query(FamilyMember).filter(FamilyMember.parent_id == member_id).update(
         {FamilyMember.parent_id: member.parent_id}
     )
     db.delete(member)
-    db.commit()
+    with commit_write(db, index) as synced:
+        if synced:
+            index.remove(member_id)
+    release(db, image_url)
     return {"detail": "تم الحذف", "id": member_id}
 
 
+@app.post("/members/{member_id}/move", response_model=FamilyMemberDetail,
+          dependencies=[Depends(require_writable), Depends(get_current_admin)])
+def move_member(member_id: int, payload: MoveRequest, db: Session = Depends(get_db),
+                index: TreeIndex = Depends(get_index)):
+    """
+    Admin — hang a member, with its whole branch, under `parent_id` (null
+    makes it a root). The branch is rewritten with one UPDATE on `path`.
+    """
+    member = get_member_or_404(db, member_id)
+    _apply_update(db, member, {"parent_id": payload.parent_id})
+    with commit_write(db, index) as synced:
+        db.refresh(member)
+        if synced:
+            index.update(member_to_dict(member))
+    return FamilyMemberDetail.model_validate(member)
+
+
+# Filled on the kept record from the duplicate when the kept one has nothing
+MERGE_FIELDS = ("branch_name", "image_url", "gender", "birth_year", "death_year", "email", "phone")
+
+
+@app.post("/members/{member_id}/merge", response_model=FamilyMemberDetail,
+          dependencies=[Depends(require_writable), Depends(get_current_admin)])
+def merge_member(member_id: int, payload: MergeRequest, db: Session = Depends(get_db),
+                 index: TreeIndex = Depends(get_index)):
+    """
+    Admin — fold the duplicate `member_id` into `into`: its children and
+    their branches move under `into`, blank fields of `into` are filled
+    from the duplicate, and the duplicate is deleted. One transaction.
+    """
+    if payload.into == member_id:
+        raise HTTPException(status_code=400, detail="لا يمكن دمج الشخص مع نفسه")
+    member = get_member_or_404(db, member_id)
+    target = get_member_or_404(db, payload.into)
+    if creates_cycle(db, member.id, target.id):
+        raise HTTPException(status_code=400, detail="لا يمكن دمج الشخص في أحد أحفاده")
+    child_ids = lineage.adopt_children(db, member, target)
+    for field in MERGE_FIELDS:
+        if getattr(target, field) is None and getattr(member, field) is not None:
+            setattr(target, field, getattr(member, field))
+    dropped_image = member.image_url if member.image_url != target.image_url else None
+    db.delete(member)
+    with commit_write(db, index) as synced:
+        kept = _reload(db, [target.id] + child_ids)
+        if synced:
+            index.remove(member_id)
+            for m in kept:
+                index.update(member_to_dict(m))
+    release(db, dropped_image)
+    return FamilyMemberDetail.model_validate(kept[0])
+
+
 # ═══════════════════════════════════════════════════════════════════════════════
 #  PHOTO UPLOAD
 # ═══════════════════════════════════════════════════════════════════════════════
 
-ALLOWED_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
-MAX_PHOTO_SIZE = 5 * 1024 * 1024  # 5 MB
+def _commit_photo(db: Session, index: TreeIndex, member: FamilyMember) -> None:
+    with commit_write(db, index) as synced:
+        db.refresh(member)
+        if synced:
+            index.update(member_to_dict(member))
+
 
-@app.post("/members/{member_id}/photo", response_model=FamilyMemberDetail)
+@app.post("/members/{member_id}/photo", response_model=FamilyMemberDetail, dependencies=[Depends(require_writable)])
 async def upload_photo(
     member_id: int,
-    file: UploadFile = File(...),
+    request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
+    index: TreeIndex = Depends(get_index),
 ):
-    """Upload / replace a member's profile photo. Open to everyone."""
-    # Validate content type
-    if file.content_type not in ALLOWED_TYPES:
-        raise HTTPException(status_code=400, detail="نوع الملف غير مدعوم — JPG/PNG/WEBP فقط")
-
-    member = get_member_or_404(db, member_id)
-
-    # Read and check size
-    contents = await file.read()
-    if len(contents) > MAX_PHOTO_SIZE:
-        raise HTTPException(status_code=413, detail="حجم الصورة يتجاوز 5 ميجا")
-
-    # Remove old photo if exists
-    if member.image_url:
-        old_path = Path(__file__).resolve().parent / member.image_url.lstrip("/")
-        if old_path.exists():
-            old_path.unlink(missing_ok=True)
-
-    # Save with unique name
-    ext = Path(file.filename).suffix or ".jpg"
-    filename = f"{member_id}_{uuid.uuid4().hex[:8]}{ext}"
-    dest = UPLOADS_DIR / filename
-    dest.write_bytes(contents)
-
-    member.image_url = f"/uploads/{filename}"
-    db.commit()
-    db.refresh(member)
+    """
+    Upload / replace a member's profile photo (multipart field `file`). Open
+    to everyone. The body is streamed to a temp file by photos.receive_photo
+    (413 as soon as it is too big); the ORM and file work runs in the threadpool.
+    """
+    member = await run_in_threadpool(get_member_or_404, db, member_id)
+    photo = await receive_photo(request, UPLOADS_DIR)
+
+    # Stored under its content hash: identical photos share one file. If the
+    # commit fails the stored copy is left for gc — another member may use it.
+    old_url = member.image_url
+    try:
+        dest = await run_in_threadpool(store, photo)
+        member.image_url = f"/uploads/{dest.name}"
+        await run_in_threadpool(_commit_photo, db, index, member)
+    except BaseException:
+        await run_in_threadpool(discard, photo.path)
+        raise
+
+    # Drop the old photo only once the new one is committed, and only if unused
+    if old_url != member.image_url:
+        await run_in_threadpool(release, db, old_url)
+    background_tasks.add_task(make_thumbnails, dest)
     return FamilyMemberDetail.model_validate(member)
 
+
+def _thumbnail_file(original: Path, size: int) -> Optional[Path]:
+    """Cached thumbnail, derived now if missing; the original if it can't be made."""
+    if not original.is_file():
+        return None
+    path = thumb_path(original, size)
+    if path.is_file() or make_thumbnails(original):
+        return path
+    return original
+
+
+@app.get("/uploads/{member_id}/thumb/{size}", include_in_schema=False)
+async def get_thumbnail(member_id: int, size: int, request: Request, v: Optional[str] = None):
+    """
+    WebP thumbnail of a member's current photo. With `v` set to the photo's
+    file name (as the frontend does) the URL can only ever mean these bytes,
+    so it is cached for a year as immutable; otherwise it is revalidated.
+    """
+    if size not in THUMB_SIZES:
+        raise HTTPException(status_code=404, detail="مقاس الصورة غير مدعوم")
+    async with async_engine.connect() as conn:
+        image_url = (await conn.execute(
+            text("SELECT image_url FROM family_members WHERE id = :id"), {"id": member_id},
+        )).scalar()
+    original = upload_path(image_url)
+    path = await run_in_threadpool(_thumbnail_file, original, size) if original else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="الصورة غير موجودة")
+    immutable = v == original.name and path != original
+    cache = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable" if immutable else "no-cache"
+    return await run_in_threadpool(file_response, request, path, {"Cache-Control": cache})
@@ -0,0 +1,172 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+The applied version is kept in SQLite's own `PRAGMA user_version`. Each
+migration runs once, in order, inside its own transaction, and is written
+to be harmless on databases that create_all() has just built from the
+current models. upgrade() runs at API startup, so deployments pick up new
+migrations automatically.
+
+    python migrations.py            # apply pending migrations
+    python migrations.py status     # show current / latest version
+    python migrations.py freeze     # migrate, then ready the file (and index snapshot) for READ_ONLY
+"""
+import sys
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = []
+
+
+def migration(version: int, name: str):
+    def register(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def _columns(conn: Connection) -> set:
+    return {c["name"] for c in inspect(conn).get_columns("family_members")}
+
+
+# ─── Migrations ──────────────────────────────────────────────────────────────
+
+@migration(1, "add family_members.is_alive")
+def _add_is_alive(conn: Connection) -> None:
+    if "is_alive" not in _columns(conn):
+        conn.execute(text("ALTER TABLE family_members ADD COLUMN is_alive INTEGER NOT NULL DEFAULT 1"))
+
+
+@migration(2, "add materialized path/depth")
+def _add_lineage_path(conn: Connection) -> None:
+    from lineage import rebuild_paths
+
+    cols = _columns(conn)
+    if "path" not in cols:
+        conn.execute(text("ALTER TABLE family_members ADD COLUMN path VARCHAR"))
+    if "depth" not in cols:
+        conn.execute(text("ALTER TABLE family_members ADD COLUMN depth INTEGER"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_family_members_path ON family_members (path)"))
+    rebuild_paths(conn)
+
+
+@migration(3, "index parent_id, branch_name and (branch_name, full_name)")
+def _add_tree_indexes(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_family_members_parent_id ON family_members (parent_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_family_members_branch_name ON family_members (branch_name)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_family_members_branch_full_name "
+        "ON family_members (branch_name, full_name)"
+    ))
+    conn.execute(text("ANALYZE family_members"))
+
+
+@migration(4, "add data_version counter")
+def _add_data_version(conn: Connection) -> None:
+    from cache import CREATE_TABLE_SQL, now_iso
+
+    conn.execute(text(CREATE_TABLE_SQL))
+    conn.execute(
+        text("INSERT OR IGNORE INTO data_version (id, version, updated_at) VALUES (1, 1, :now)"),
+        {"now": now_iso()},
+    )
+
+
+@migration(5, "add import manifest tables")
+def _add_import_manifest(conn: Connection) -> None:
+    from import_manifest import CREATE_TABLES_SQL
+
+    for sql in CREATE_TABLES_SQL:
+        conn.execute(text(sql))
+
+
+@migration(6, "add data_version.db_id")
+def _add_db_id(conn: Connection) -> None:
+    cols = {c["name"] for c in inspect(conn).get_columns("data_version")}
+    if "db_id" not in cols:
+        conn.execute(text("ALTER TABLE data_version ADD COLUMN db_id TEXT"))
+    conn.execute(text("UPDATE data_version SET db_id = lower(hex(randomblob(16))) WHERE db_id IS NULL"))
+
+
+# ─── Runner ──────────────────────────────────────────────────────────────────
+
+def current_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def latest_version() -> int:
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def run_migrations(engine: Engine) -> int:
+    """Apply every migration newer than the database. Returns how many ran."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    applied = 0
+    for number, name, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        logging.info("migrations: applying %d — %s", number, name)
+        with engine.begin() as conn:
+            fn(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(number)}")
+        applied += 1
+    return applied
+
+
+def upgrade(engine: Engine) -> int:
+    """Create missing tables, apply pending migrations, backfill stray paths."""
+    from db import Base
+    import models  # noqa: F401 — registers the tables on Base
+    from lineage import backfill_paths
+
+    Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
+    backfill_paths(engine)
+    return applied
+
+
+def freeze(engine: Engine) -> int:
+    """
+    Bring the database to the latest schema, fold the WAL back into the
+    main file with a rollback journal, so the single file is complete when
+    opened with immutable=1 (see db.READ_ONLY), and write the tree index
+    snapshot for it. `engine` must not switch journal_mode on connect, i.e.
+    use the 'default' profile. Returns the number of members.
+    """
+    from sqlalchemy.orm import Session
+    from tree_index import TreeIndex, SNAPSHOT_PATH
+
+    upgrade(engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.exec_driver_sql("PRAGMA journal_mode = DELETE")
+    index = TreeIndex()
+    with Session(engine) as db:
+        index.load(db)
+    index.save_snapshot(SNAPSHOT_PATH)
+    engine.dispose()
+    return len(index.members)
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    if sys.argv[1:] == ["status"]:
+        with engine.connect() as conn:
+            print(f"schema version {current_version(conn)} / latest {latest_version()}")
+    elif sys.argv[1:] == ["freeze"]:
+        from db import make_engine
+        n = freeze(make_engine(profile="default"))
+        logging.info("✅ schema at version %d, journal_mode=DELETE, snapshot of %d members — ready for READ_ONLY",
+                     latest_version(), n)
+    elif not sys.argv[1:]:
+        n = upgrade(engine)
+        logging.info("✅ %d migration(s) applied — schema at version %d", n, latest_version())
+    else:
+        sys.exit("usage: python migrations.py [status | freeze]")
@@ -1,14 +1,17 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, Index
 from db import Base
 
 
 class FamilyMember(Base):
     __tablename__ = "family_members"
+    __table_args__ = (
+        Index("ix_family_members_branch_full_name", "branch_name", "full_name"),
+    )
 
     id          = Column(Integer, primary_key=True, index=True)
     full_name   = Column(String, nullable=False, index=True)
-    branch_name = Column(String, nullable=True)
-    parent_id   = Column(Integer, nullable=True)
+    branch_name = Column(String, nullable=True, index=True)
+    parent_id   = Column(Integer, nullable=True, index=True)
     image_url   = Column(String, nullable=True)
     gender      = Column(String, nullable=True)   # 'male' | 'female'
     birth_year  = Column(Integer, nullable=True)
@@ -16,3 +19,5 @@ class FamilyMember(Base):
     email       = Column(String, nullable=True)
     phone       = Column(String, nullable=True)
     is_alive    = Column(Boolean, default=True, nullable=False)
+    path        = Column(String, nullable=True, index=True)   # '/root_id/…/id/' — see lineage.py
+    depth       = Column(Integer, nullable=True)              # roots = 0
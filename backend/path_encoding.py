@@ -0,0 +1,50 @@
+"""
+The materialized-path encoding itself (see lineage.py): the path string of
+a member and the (path, depth) a whole set of (id, parent_id) rows implies.
+
+Standard library only, so scripts that write the database without the API
+stack (import_registry.py) compute the same paths the API maintains.
+"""
+from collections import deque
+from itertools import chain
+from typing import Dict, Iterable, Optional
+
+
+def path_for(parent_path: Optional[str], member_id: int) -> str:
+    return f"{parent_path or '/'}{member_id}/"
+
+
+def subtree_upper(path: str) -> str:
+    """Exclusive upper bound of every path that starts with `path`."""
+    return path[:-1] + "0"
+
+
+def compute_paths(rows: Iterable[tuple]) -> Dict[int, tuple]:
+    """
+    id → (path, depth) implied by (id, parent_id) rows. Roots, and children
+    of missing parents, each start their own branch; anything still
+    unvisited afterwards sits on a parent_id cycle and is given a root path
+    so the encoding stays well-formed.
+    """
+    rows = list(rows)
+    parent = dict(rows)
+    children: dict = {}
+    for mid, pid in rows:
+        children.setdefault(pid, []).append(mid)
+
+    encoded: Dict[int, tuple] = {}
+    starts = [mid for mid, pid in rows if pid is None or pid not in parent]
+    for start in chain(starts, parent):
+        if start in encoded:
+            continue
+        encoded[start] = (path_for(None, start), 0)
+        queue = deque([start])
+        while queue:
+            mid = queue.popleft()
+            path, depth = encoded[mid]
+            for cid in children.get(mid, ()):
+                if cid in encoded:
+                    continue
+                encoded[cid] = (path_for(path, cid), depth + 1)
+                queue.append(cid)
+    return encoded
@@ -0,0 +1,353 @@
+"""
+Photo storage: streaming upload, content-addressed files, thumbnails.
+
+The multipart body is parsed as it arrives instead of being buffered by
+request.form(): the photo's bytes go chunk by chunk into a temporary file
+in the uploads directory, and the upload is refused with 413 as soon as it
+passes MAX_PHOTO_SIZE — or before reading anything, when Content-Length
+already says so. Every blocking file operation runs in the threadpool, so
+a few large uploads don't stall other requests on the event loop.
+
+Photos are stored under the SHA-256 of their bytes (`<hash>.<ext>`), so
+the same group photo attached to twenty relatives is one file; store()
+moves the temp file into place with os.replace (atomic on the same
+filesystem), or drops it if that content is already there. A file's
+references are the family_members rows whose image_url points at it:
+release() deletes a photo once nobody uses it and it is older than the gc
+grace period (a fresh file may be a dedup target whose commit is in
+flight), and `python photos.py gc` sweeps whatever slipped through (failed
+writes, deleted members, recently stored files, files from before content
+addressing).
+
+Each stored photo also gets WebP thumbnails at THUMB_SIZES under
+`thumbs/`, made after the upload by a background task, or on first request
+if that hasn't happened. They need Pillow; without it the thumbnail route
+serves the original.
+
+    python photos.py gc [--dry-run]
+"""
+import os
+import re
+import sys
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+# Stored extension comes from the checked content type, never the client's filename
+ALLOWED_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+MAX_PHOTO_SIZE = 5 * 1024 * 1024  # 5 MB
+FORM_OVERHEAD = 16 * 1024         # boundaries, part headers, small extra fields
+THUMB_SIZES = (64, 128, 256)      # shorter side in px: tree avatar 1x/2x, profile 2x
+THUMB_QUALITY = 80
+HASH_NAME = re.compile(r"^[0-9a-f]{32}\.(jpg|png|webp|gif)$")
+LEGACY_NAME = re.compile(r"^\d+_[0-9a-f]{8}\.[A-Za-z0-9]+$")  # <member id>_<uuid[:8]><ext>, before content addressing
+GC_GRACE_SECONDS = 3600           # leave files this young alone: their commit may be in flight
+
+# On Vercel the task filesystem is read-only; use /tmp for writable storage
+if os.getenv("VERCEL") or not os.access(Path(__file__).resolve().parent, os.W_OK):
+    UPLOADS_DIR = Path("/tmp/uploads")
+else:
+    UPLOADS_DIR = Path(__file__).resolve().parent / "uploads"
+
+# store() and release() both decide on "is this content address in use";
+# the lock keeps a dedup from landing between release()'s check and unlink.
+_address_lock = threading.Lock()
+
+
+@dataclass
+class ReceivedPhoto:
+    path: Path              # temp file in the uploads directory; caller stores or discards it
+    filename: str
+    content_type: str
+    size: int
+    digest: str             # first 128 bits of the SHA-256, hex
+
+    @property
+    def stored_name(self) -> str:
+        return f"{self.digest}{ALLOWED_TYPES[self.content_type]}"
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail="حجم الصورة يتجاوز 5 ميجا")
+
+
+def discard(path: Optional[Path]) -> None:
+    if path is not None:
+        path.unlink(missing_ok=True)
+
+
+def upload_path(image_url: Optional[str]) -> Optional[Path]:
+    """File behind an `/uploads/<name>` image_url, wherever UPLOADS_DIR is."""
+    if image_url and image_url.startswith("/uploads/"):
+        return UPLOADS_DIR / Path(image_url).name
+    return None
+
+
+def is_immutable(filename: str) -> bool:
+    """Content-addressed names never change meaning, so they can be cached forever."""
+    return bool(HASH_NAME.match(filename))
+
+
+def is_photo_name(filename: str) -> bool:
+    """A name a stored photo can have — never a temp file (those start with '.')."""
+    return bool(HASH_NAME.match(filename) or LEGACY_NAME.match(filename))
+
+
+# ─── Content-addressed storage ───────────────────────────────────────────────
+
+def store(photo: ReceivedPhoto) -> Path:
+    """Move the upload to its content address; if the bytes are already stored, keep that copy."""
+    dest = UPLOADS_DIR / photo.stored_name
+    with _address_lock:
+        if dest.is_file():
+            discard(photo.path)
+            os.utime(dest)  # fresh mtime: release() and gc leave it alone until the commit lands
+        else:
+            os.replace(photo.path, dest)
+    return dest
+
+
+def references(db, image_url: str) -> int:
+    """How many members point at `image_url` (db: Session or Connection)."""
+    return db.execute(
+        text("SELECT COUNT(*) FROM family_members WHERE image_url = :url"), {"url": image_url},
+    ).scalar()
+
+
+def release(db, image_url: Optional[str]) -> bool:
+    """
+    Call after committing a change that dropped a reference to `image_url`:
+    deletes the file and its thumbnails if no member uses it any more.
+    A file stored in the last GC_GRACE_SECONDS is kept even when unreferenced:
+    an upload of the same bytes may be about to commit a reference to it
+    (gc removes it later if not).
+    """
+    path = upload_path(image_url)
+    if path is None or references(db, image_url):
+        return False
+    with _address_lock:
+        try:
+            if path.stat().st_mtime > time.time() - GC_GRACE_SECONDS:
+                return False
+        except FileNotFoundError:
+            return False
+        discard_photo(path)
+    return True
+
+
+# ─── Thumbnails ──────────────────────────────────────────────────────────────
+
+def thumb_path(original: Path, size: int) -> Path:
+    return original.parent / "thumbs" / f"{original.stem}_{size}.webp"
+
+
+def make_thumbnails(original: Path, sizes=THUMB_SIZES) -> bool:
+    """
+    Write the WebP variants of `original` (blocking — run it in the
+    threadpool or as a background task). Each is scaled so its shorter side
+    is `size` (never upscaled), matching object-fit: cover avatars.
+    Pillow is imported here, not at module level: a cold start never makes
+    thumbnails, so it shouldn't pay for the import.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # optional: thumbnails fall back to the original photo
+        return False
+    if all(thumb_path(original, size).is_file() for size in sizes):
+        return True  # same content already stored and derived
+    try:
+        with Image.open(original) as im:
+            im = ImageOps.exif_transpose(im)  # first frame only for GIFs
+            im = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") else "RGB")
+            thumb_path(original, sizes[0]).parent.mkdir(exist_ok=True)
+            for size in sizes:
+                scale = size / min(im.size)
+                variant = im.resize((max(1, round(im.width * scale)), max(1, round(im.height * scale))),
+                                    Image.LANCZOS) if scale < 1 else im
+                dest = thumb_path(original, size)
+                fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.stem}-", suffix=".tmp")
+                os.close(fd)
+                try:
+                    variant.save(tmp, "WEBP", quality=THUMB_QUALITY, method=4)
+                    os.replace(tmp, dest)
+                finally:
+                    discard(Path(tmp))
+        return True
+    except Exception as e:  # a corrupt upload shouldn't break anything else
+        logging.warning("photos: no thumbnails for %s (%s)", original.name, e)
+        return False
+
+
+def discard_photo(original: Optional[Path]) -> None:
+    """Remove a stored photo and its thumbnails."""
+    if original is None:
+        return
+    original.unlink(missing_ok=True)
+    for size in THUMB_SIZES:
+        thumb_path(original, size).unlink(missing_ok=True)
+
+
+async def receive_photo(request: Request, dest_dir: Path, field: str = "file") -> ReceivedPhoto:
+    """Stream the `field` file part of a multipart request into a temp file under `dest_dir`."""
+    # Imported here, like Pillow: only an upload needs the parser, not a cold start
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    content_type, params = parse_options_header(request.headers.get("content-type"))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="لم يتم إرفاق صورة")
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_PHOTO_SIZE + FORM_OVERHEAD:
+        raise _too_large()
+
+    # Parser callbacks run synchronously inside parser.write(); they only
+    # collect state, and the awaiting happens in the loop below.
+    headers: dict = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    part = {"ours": False, "done": False}
+    photo = {"filename": "", "content_type": "", "size": 0}
+    pending: list = []
+
+    def on_part_begin():
+        headers.clear()
+        part["ours"] = False
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        _, disp = parse_options_header(headers.get(b"content-disposition"))
+        if disp.get(b"name", b"").decode() != field or b"filename" not in disp or part["done"]:
+            return
+        ctype = headers.get(b"content-type", b"").decode("latin-1").strip()
+        if ctype not in ALLOWED_TYPES:
+            raise HTTPException(status_code=400, detail="نوع الملف غير مدعوم — JPG/PNG/WEBP فقط")
+        part["ours"] = True
+        photo["filename"] = disp[b"filename"].decode("utf-8", "replace")
+        photo["content_type"] = ctype
+
+    def on_part_data(data, start, end):
+        if part["ours"]:
+            photo["size"] += end - start
+            if photo["size"] > MAX_PHOTO_SIZE:
+                raise _too_large()
+            pending.append(data[start:end])
+
+    def on_part_end():
+        if part["ours"]:
+            part["ours"], part["done"] = False, True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field,
+        "on_header_value": on_header_value, "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished, "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    out = None
+    path: Optional[Path] = None
+    digest = hashlib.sha256()
+
+    def write(data: bytes) -> None:
+        digest.update(data)
+        out.write(data)
+
+    try:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_PHOTO_SIZE + FORM_OVERHEAD:
+                raise _too_large()
+            parser.write(chunk)
+            if pending:
+                if out is None:
+                    out = await run_in_threadpool(
+                        tempfile.NamedTemporaryFile, dir=dest_dir, prefix=".upload-", delete=False)
+                    path = Path(out.name)
+                data = b"".join(pending)
+                pending.clear()
+                await run_in_threadpool(write, data)
+        parser.finalize()
+        if not part["done"]:
+            raise HTTPException(status_code=400, detail="لم يتم إرفاق صورة")
+        if out is None:  # an empty file part
+            out = await run_in_threadpool(
+                tempfile.NamedTemporaryFile, dir=dest_dir, prefix=".upload-", delete=False)
+            path = Path(out.name)
+        await run_in_threadpool(out.close)
+        return ReceivedPhoto(path=path, digest=digest.hexdigest()[:32], **photo)
+    except BaseException:
+        if out is not None:
+            await run_in_threadpool(out.close)
+        await run_in_threadpool(discard, path)
+        raise
+
+
+# ─── Garbage collection ──────────────────────────────────────────────────────
+
+def collect_garbage(db, dry_run: bool = False) -> list:
+    """
+    Delete photos no member references, thumbnails whose photo is gone, and
+    abandoned upload temp files. Anything modified in the last
+    GC_GRACE_SECONDS is kept. Returns the paths removed (or that would be).
+    """
+    referenced = {
+        Path(url).name
+        for (url,) in db.execute(text("SELECT DISTINCT image_url FROM family_members WHERE image_url IS NOT NULL"))
+    }
+    cutoff = time.time() - GC_GRACE_SECONDS
+    doomed = []
+    if not UPLOADS_DIR.is_dir():
+        return doomed
+    kept_stems = set()
+    photo_suffixes = set(ALLOWED_TYPES.values())
+    for entry in UPLOADS_DIR.iterdir():
+        if not entry.is_file() or not (entry.suffix in photo_suffixes or entry.name.startswith(".upload-")):
+            continue
+        if entry.name in referenced or entry.stat().st_mtime > cutoff:
+            kept_stems.add(entry.stem)
+            continue
+        doomed.append(entry)
+    thumbs = UPLOADS_DIR / "thumbs"
+    if thumbs.is_dir():
+        for entry in thumbs.iterdir():
+            stem = entry.name.rsplit("_", 1)[0]
+            if entry.is_file() and stem not in kept_stems and entry.stat().st_mtime <= cutoff:
+                doomed.append(entry)
+    if not dry_run:
+        for path in doomed:
+            discard(path)
+    return doomed
+
+
+if __name__ == "__main__":
+    from db import engine
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    args = sys.argv[1:]
+    if args not in (["gc"], ["gc", "--dry-run"]):
+        sys.exit("usage: python photos.py gc [--dry-run]")
+    dry_run = "--dry-run" in args
+    with engine.connect() as conn:
+        removed = collect_garbage(conn, dry_run=dry_run)
+    for path in removed:
+        logging.info("%s %s", "would remove" if dry_run else "removed", path.relative_to(UPLOADS_DIR))
+    logging.info("✅ %d unreferenced file(s) %s", len(removed), "found" if dry_run else "removed")
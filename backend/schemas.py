@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 
 
@@ -26,6 +26,20 @@ class SearchResult(FamilyMemberBase):
     pass
 
 
+class SubtreeNode(SearchResult):
+    """A member with its descendants nested, as returned by /subtree."""
+    child_count: int = 0
+    children:    List["SubtreeNode"] = []
+
+
+class Suggestion(BaseModel):
+    """Autocomplete entry — lineage holds father, grandfather, … (nearest first)."""
+    id:          int
+    full_name:   str
+    branch_name: Optional[str] = None
+    lineage:     List[str] = []
+
+
 class LineageResponse(BaseModel):
     person:  FamilyMemberDetail
     lineage: List[SearchResult]
@@ -47,7 +61,7 @@ class FamilyMemberUpdate(BaseModel):
     """All fields optional — only provided fields get updated."""
     full_name:   Optional[str] = Field(None, min_length=2, max_length=120)
     branch_name: Optional[str] = Field(None, max_length=80)
-    parent_id:   Optional[int] = None
+    parent_id:   Optional[int] = Field(None, ge=1)   # null → becomes a root
     gender:      Optional[str] = Field(None, pattern="^(male|female)$")
     birth_year:  Optional[int] = Field(None, ge=1300, le=2100)
     death_year:  Optional[int] = Field(None, ge=1300, le=2100)
@@ -56,6 +70,40 @@ class FamilyMemberUpdate(BaseModel):
     is_alive:    Optional[bool] = None
 
 
+MAX_BATCH = 200  # members per batch request, all written in one transaction
+
+
+class FamilyMemberBatchCreate(FamilyMemberCreate):
+    """A member in a batch; `ref` names it so later entries can use it as `parent_ref`."""
+    ref:         Optional[str] = Field(None, min_length=1, max_length=40)
+    parent_ref:  Optional[str] = Field(None, min_length=1, max_length=40)
+
+
+class FamilyMemberBatchUpdate(FamilyMemberUpdate):
+    id:          int
+
+
+class BatchCreateRequest(BaseModel):
+    members: List[FamilyMemberBatchCreate] = Field(..., min_length=1, max_length=MAX_BATCH)
+
+
+class BatchUpdateRequest(BaseModel):
+    members: List[FamilyMemberBatchUpdate] = Field(..., min_length=1, max_length=MAX_BATCH)
+
+
+class BatchCreateResponse(BaseModel):
+    members: List[FamilyMemberDetail]
+    refs:    Dict[str, int] = {}   # ref → id assigned by the database
+
+
+class MoveRequest(BaseModel):
+    parent_id: Optional[int] = Field(None, ge=1)   # None → the branch becomes a root
+
+
+class MergeRequest(BaseModel):
+    into: int = Field(..., ge=1)   # the record to keep
+
+
 class LoginRequest(BaseModel):
     username: str
     password: str
@@ -66,8 +114,17 @@ class TokenResponse(BaseModel):
     token_type:   str = "bearer"
 
 
+class BranchStats(BaseModel):
+    branch_name: Optional[str] = None
+    total:       int
+    living:      int
+    deceased:    int
+    generations: int
+
+
 class StatsResponse(BaseModel):
     total:       int
     living:      int
     deceased:    int
     generations: int
+    branches:    List[BranchStats] = []
@@ -0,0 +1,152 @@
+"""
+Arabic-aware name search.
+
+Names are folded to a canonical form before indexing and before querying:
+diacritics and kashida dropped, أ/إ/آ/ٱ → ا, ى/ئ → ي, ؤ → و, ة → ه,
+Arabic-Indic digits → 0-9, and whitespace removed — so "أبوعلي" and
+"ابو علي" both become "ابوعلي". Folded names are kept in a sorted array,
+so exact and prefix hits are found with a bisect, then ranked: whole-word
+matches before longer words that merely start the same, shorter names
+first. Only when those don't fill the page do we look inside names: each folded name is split into
+trigrams, the query intersects the posting sets of its own trigrams, and
+the surviving candidates are checked by substring match and ranked.
+"""
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Set, Tuple
+
+_TASHKEEL = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")  # harakat, marks, kashida
+_FOLD = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه",
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+})
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    """Canonical spaced form: 'أبو  عليّ' → 'ابو علي'."""
+    s = _TASHKEEL.sub("", name or "").translate(_FOLD).lower()
+    return _SPACES.sub(" ", s).strip()
+
+
+def compact(normalized: str) -> str:
+    return normalized.replace(" ", "")
+
+
+def trigrams(key: str) -> Set[str]:
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class SearchIndex:
+    def __init__(self):
+        self.keys:     Dict[int, str]      = {}  # id → compact folded name
+        self.starts:   Dict[int, frozenset] = {}  # id → offsets in key where a word begins
+        self.postings: Dict[str, Set[int]] = {}  # trigram → ids
+        self.sorted:   List[tuple]         = []  # [(key, id)] in key order
+        self._lock = threading.RLock()
+
+    def __getstate__(self) -> dict:
+        return {k: v for k, v in self.__dict__.items() if k != "_lock"}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _fold(full_name: str) -> tuple:
+        """(compact key, offsets in it where a word begins)"""
+        norm = normalize_name(full_name)
+        offsets, pos = set(), 0
+        for word in norm.split(" "):
+            offsets.add(pos)
+            pos += len(word)
+        return compact(norm), frozenset(offsets)
+
+    def build(self, items: Iterable[Tuple[int, str]]) -> None:
+        """Index (id, full_name) pairs from scratch: append, then sort once."""
+        keys, starts, postings, ordered = {}, {}, {}, []
+        for mid, full_name in items:
+            key, offsets = self._fold(full_name)
+            keys[mid], starts[mid] = key, offsets
+            ordered.append((key, mid))
+            for g in trigrams(key):
+                postings.setdefault(g, set()).add(mid)
+        ordered.sort()
+        with self._lock:
+            self.keys, self.starts, self.postings, self.sorted = keys, starts, postings, ordered
+
+    def add(self, mid: int, full_name: str) -> None:
+        """One member — a write-through patch; bulk loads go through build()."""
+        key, offsets = self._fold(full_name)
+        with self._lock:
+            self.keys[mid] = key
+            self.starts[mid] = offsets
+            insort(self.sorted, (key, mid))
+            for g in trigrams(key):
+                self.postings.setdefault(g, set()).add(mid)
+
+    def remove(self, mid: int) -> None:
+        with self._lock:
+            key = self.keys.pop(mid, None)
+            self.starts.pop(mid, None)
+            if key is None:
+                return
+            i = bisect_left(self.sorted, (key, mid))
+            if i < len(self.sorted) and self.sorted[i] == (key, mid):
+                del self.sorted[i]
+            for g in trigrams(key):
+                ids = self.postings.get(g)
+                if ids is not None:
+                    ids.discard(mid)
+                    if not ids:
+                        del self.postings[g]
+
+    def prefixed(self, q: str, limit: int) -> List[int]:
+        """
+        Ids whose folded name starts with the folded query `q`, best first:
+        names where `q` ends on a word boundary ('محمد علي' for 'محمد', and
+        'محمد' itself), then shorter names ('محمدين' after those), then key
+        order. The bisect finds the range; ranking it means reading all of it.
+        """
+        hits = []
+        with self._lock:
+            i = bisect_left(self.sorted, (q,))
+            while i < len(self.sorted) and self.sorted[i][0].startswith(q):
+                key, mid = self.sorted[i]
+                whole_word = len(key) == len(q) or len(q) in self.starts[mid]
+                hits.append((0 if whole_word else 1, len(key), key, mid))
+                i += 1
+        return [h[3] for h in heapq.nsmallest(limit, hits)]
+
+    def suggest(self, prefix: str, limit: int) -> List[int]:
+        q = compact(normalize_name(prefix))
+        return self.prefixed(q, limit) if q and limit > 0 else []
+
+    def search(self, query: str, limit: int) -> List[int]:
+        """Ids of the best `limit` matches: exact, then prefix (ranked as in prefixed), then word-start, then infix."""
+        q = compact(normalize_name(query))
+        if not q or limit <= 0:
+            return []
+        with self._lock:
+            found = self.prefixed(q, limit)  # exact matches sort first
+            if len(found) >= limit:
+                return found
+            grams = trigrams(q)
+            if grams:
+                sets = sorted((self.postings.get(g, set()) for g in grams), key=len)
+                candidates = set.intersection(*sets) if sets[0] else set()
+            else:
+                candidates = self.keys.keys()  # 1–2 letters: too short for trigrams
+            hits = []
+            for mid in candidates:
+                key = self.keys[mid]
+                pos = key.find(q)
+                if pos <= 0:
+                    continue  # no match, or a prefix hit already in `found`
+                rank = 0 if pos in self.starts[mid] else 1
+                hits.append((rank, len(key), key, mid))
+            return found + [h[3] for h in heapq.nsmallest(limit - len(found), hits)]
@@ -0,0 +1,32 @@
+"""
+JSON encoding for the read endpoints.
+
+The in-memory index already holds members as plain dicts shaped like
+SearchResult, so read endpoints encode those dicts straight to bytes and
+return a ready Response — FastAPI then skips both the per-row pydantic
+validation and the response_model round-trip. orjson is used when it is
+installed; the stdlib encoder is the fallback.
+"""
+from typing import Any, Mapping, Optional
+
+from fastapi import Response
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+except ImportError:  # pragma: no cover — orjson is in requirements, stdlib is the safety net
+    import json
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_response(obj: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> Response:
+    return Response(content=dumps(obj), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def ndjson_line(obj: Any) -> bytes:
+    return dumps(obj) + b"\n"
@@ -0,0 +1,373 @@
+"""
+In-memory index of the family graph.
+
+The whole family_members table is small enough to keep in the API process:
+we load it once, then the write endpoints patch the index right after they
+commit, so read endpoints never have to go back to SQLite.
+
+A built index can be pickled to a snapshot file and loaded back, which on a
+serverless cold start is cheaper than rebuilding it from the table. The
+snapshot records the database it was built from (data_version.db_id) and
+the data version; it is only adopted when both match, otherwise
+ensure_current() simply rebuilds from SQLite. The snapshot
+lives at $INDEX_SNAPSHOT (default backend/tree_index.snapshot) and is
+written by `python migrations.py freeze`.
+"""
+import os
+import pickle
+import logging
+import threading
+from bisect import insort
+from collections import Counter, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from cache import read_db_id, read_version
+from search_index import SearchIndex
+
+MEMBER_COLUMNS = (
+    "id", "full_name", "branch_name", "parent_id", "image_url", "gender",
+    "birth_year", "death_year", "email", "phone", "is_alive",
+)
+
+SNAPSHOT_PATH = Path(os.getenv("INDEX_SNAPSHOT", Path(__file__).resolve().parent / "tree_index.snapshot"))
+SNAPSHOT_FORMAT = 2
+
+
+def member_to_dict(m) -> dict:
+    """Plain-dict copy of a FamilyMember row, shaped like SearchResult."""
+    d = {col: getattr(m, col) for col in MEMBER_COLUMNS}
+    d["is_alive"] = bool(d["is_alive"]) if d["is_alive"] is not None else True
+    return d
+
+
+def row_to_dict(row) -> dict:
+    """Same as member_to_dict, for a raw `SELECT <MEMBER_COLUMNS>` row."""
+    d = dict(zip(MEMBER_COLUMNS, row))
+    d["is_alive"] = bool(d["is_alive"]) if d["is_alive"] is not None else True
+    return d
+
+
+def _dec(counter: Counter, key) -> None:
+    counter[key] -= 1
+    if not counter[key]:
+        del counter[key]
+
+
+def _generations(depths: Counter) -> int:
+    return max(depths) - min(depths) + 1 if depths else 0
+
+
+_LOCKS = ("_lock", "_view_lock")
+
+
+class TreeIndex:
+    def __init__(self):
+        self.members:  Dict[int, dict]          = {}  # id → member dict
+        self.parent:   Dict[int, Optional[int]] = {}  # child → parent
+        self.children: Dict[int, List[tuple]]   = {}  # parent → sorted [(name_key, id)]
+        self.depth:    Dict[int, int]           = {}  # id → generation (roots = 0)
+        self.name_key: Dict[int, str]           = {}  # id → sort key, same order as ORDER BY full_name
+        self.roots:    List[tuple]              = []  # sorted [(name_key, id)] with parent_id NULL
+        self.search = SearchIndex()                         # normalized-name trigram index
+        # Running totals for /stats, kept in step by every write
+        self.living = 0
+        self.depth_hist: Counter = Counter()                # depth → members at that depth
+        self.branches: Dict[Optional[str], dict] = {}       # branch → {total, living, depths}
+        self.version = None                                  # data_version the index reflects
+        self.db_id = None                                    # ...of this database (cache.read_db_id)
+        self.loaded = False
+        # _lock serializes rebuilds and writes (held in worker threads, for
+        # as long as they take); _view_lock is only held while structures
+        # are read, patched or swapped, so reads on the event loop never
+        # wait for a rebuild.
+        self._lock = threading.RLock()
+        self._view_lock = threading.RLock()
+
+    # ── Build ────────────────────────────────────────────────────────────────
+    def load(self, db: Session) -> None:
+        """Rebuild from the table into fresh structures, then swap them in."""
+        # Read the version first: a write landing between the two reads
+        # leaves us marked one version behind, which only costs a reload.
+        version = read_version(db)[0]
+        db_id = read_db_id(db)
+        rows = db.execute(text(f"SELECT {', '.join(MEMBER_COLUMNS)} FROM family_members")).fetchall()
+        fresh = TreeIndex()
+        fresh._build(rows)
+        fresh.version = version
+        fresh.db_id = db_id
+        fresh.loaded = True
+        self._swap(fresh.__dict__)
+
+    def _build(self, rows) -> None:
+        """Fill an empty, unshared index from `SELECT <MEMBER_COLUMNS>` rows."""
+        for row in rows:
+            d = row_to_dict(row)
+            self.members[d["id"]] = d
+            self._tally(d, +1)
+            self.parent[d["id"]] = d["parent_id"]
+            self.name_key[d["id"]] = d["full_name"]
+        self.search.build(self.name_key.items())
+        for mid, pid in self.parent.items():
+            key = (self.name_key[mid], mid)
+            if pid is None:
+                self.roots.append(key)
+            else:
+                self.children.setdefault(pid, []).append(key)
+        self.roots.sort()
+        for kids in self.children.values():
+            kids.sort()
+        # Roots and children of missing parents start a branch at depth 0
+        starts = [mid for mid, pid in self.parent.items() if pid is None or pid not in self.members]
+        for mid in starts:
+            self._set_depth(mid, 0)
+            self._fill_depths(mid)
+        for mid in self.members:
+            if mid not in self.depth:
+                self._set_depth(mid, 0)  # unreachable — part of a parent_id cycle
+
+    def _swap(self, state: dict) -> None:
+        """Replace every structure at once; a read sees the old set or the new one."""
+        with self._view_lock:
+            self.__dict__.update({k: v for k, v in state.items() if k not in _LOCKS})
+
+    def ensure_loaded(self, db: Session) -> "TreeIndex":
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load(db)
+        return self
+
+    def ensure_current(self, db: Session, version: int) -> "TreeIndex":
+        """Reload if another process has written since we last loaded."""
+        if not self.loaded or self.version != version:
+            with self._lock:
+                if not self.loaded or self.version != version:
+                    self.load(db)
+        return self
+
+    @contextmanager
+    def advance(self, old: int, new: int) -> Iterator[bool]:
+        """
+        Entered after a local write moved the data version from `old` to `new`.
+        Yields True if the caller should patch the index with its change;
+        False means someone else wrote in between, so the index is dropped
+        and will be reloaded on the next read. The write lock is held until
+        the block ends and `version` only becomes `new` then: a read that
+        already saw `new` in the database finds the index behind and waits
+        for the block in the threadpool, so the new version (and ETag) is
+        never paired with the unpatched index.
+        """
+        with self._lock:
+            synced = self.loaded and self.version == old
+            if not synced:
+                self.loaded = False
+            try:
+                yield synced
+            except BaseException:
+                self.loaded = False  # half-patched: rebuild on the next read
+                raise
+            if synced:
+                self.version = new
+
+    # ── Snapshot ─────────────────────────────────────────────────────────────
+    def save_snapshot(self, path: Path = SNAPSHOT_PATH) -> None:
+        with self._view_lock:
+            state = {k: v for k, v in self.__dict__.items() if k not in _LOCKS}
+            data = pickle.dumps({"format": SNAPSHOT_FORMAT, "state": state}, pickle.HIGHEST_PROTOCOL)
+        tmp = Path(f"{path}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+    def load_snapshot(self, db_id: Optional[str], version: int, path: Path = SNAPSHOT_PATH) -> bool:
+        """
+        Adopt a saved index if it was built from database `db_id` at `version`.
+        False (and nothing changed) if there is no such snapshot.
+        """
+        try:
+            snap = pickle.loads(Path(path).read_bytes())
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.warning("tree_index: ignoring snapshot %s (%s)", path, e)
+            return False
+        if snap.get("format") != SNAPSHOT_FORMAT:
+            return False
+        state = snap["state"]
+        if db_id is None or state.get("db_id") != db_id or state.get("version") != version:
+            return False
+        self._swap(state)
+        return True
+
+    def _fill_depths(self, top: int) -> None:
+        """Recompute depths below `top` from its own depth (BFS, cycle-safe)."""
+        seen = {top}
+        queue = deque([top])
+        while queue:
+            mid = queue.popleft()
+            for _, cid in self.children.get(mid, ()):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                self._set_depth(cid, self.depth[mid] + 1)
+                queue.append(cid)
+
+    def _tally(self, member: dict, sign: int) -> None:
+        """Add (+1) or withdraw (-1) a member from the total/living/branch counts."""
+        b = self.branches.setdefault(member["branch_name"], {"total": 0, "living": 0, "depths": Counter()})
+        alive = sign if member["is_alive"] else 0
+        b["total"] += sign
+        b["living"] += alive
+        self.living += alive
+        if not b["total"]:
+            del self.branches[member["branch_name"]]
+
+    def _set_depth(self, mid: int, depth: int) -> None:
+        """Record a member's depth and move it between the depth histograms."""
+        self._forget_depth(mid)
+        self.depth[mid] = depth
+        self.depth_hist[depth] += 1
+        self.branches[self.members[mid]["branch_name"]]["depths"][depth] += 1
+
+    def _forget_depth(self, mid: int) -> None:
+        old = self.depth.pop(mid, None)
+        if old is not None:
+            _dec(self.depth_hist, old)
+            _dec(self.branches[self.members[mid]["branch_name"]]["depths"], old)
+
+    def _siblings(self, pid: Optional[int]) -> List[tuple]:
+        return self.roots if pid is None else self.children.setdefault(pid, [])
+
+    def _attach(self, mid: int, pid: Optional[int]) -> None:
+        self.parent[mid] = pid
+        insort(self._siblings(pid), (self.name_key[mid], mid))
+        parent_depth = self.depth.get(pid) if pid is not None else None
+        self._set_depth(mid, 0 if parent_depth is None else parent_depth + 1)
+        self._fill_depths(mid)
+
+    def _detach(self, mid: int) -> None:
+        siblings = self._siblings(self.parent[mid])
+        siblings.remove((self.name_key[mid], mid))
+
+    # ── Write-through ────────────────────────────────────────────────────────
+    def add(self, member: dict) -> None:
+        with self._view_lock:
+            mid = member["id"]
+            self.members[mid] = member
+            self._tally(member, +1)
+            self.name_key[mid] = member["full_name"]
+            self.search.add(mid, member["full_name"])
+            self._attach(mid, member["parent_id"])
+
+    def update(self, member: dict) -> None:
+        with self._view_lock:
+            mid = member["id"]
+            if mid not in self.members:
+                self.add(member)
+                return
+            self._detach(mid)
+            self._forget_depth(mid)
+            self._tally(self.members[mid], -1)
+            if member["full_name"] != self.name_key[mid]:
+                self.search.remove(mid)
+                self.search.add(mid, member["full_name"])
+            self.members[mid] = member
+            self._tally(member, +1)
+            self.name_key[mid] = member["full_name"]
+            self._attach(mid, member["parent_id"])
+
+    def remove(self, mid: int) -> None:
+        """Drop a member and hand its children to its parent, like delete_member."""
+        with self._view_lock:
+            if mid not in self.members:
+                return
+            pid = self.parent[mid]
+            self._detach(mid)
+            self._forget_depth(mid)
+            self._tally(self.members[mid], -1)
+            for _, cid in self.children.pop(mid, []):
+                self.members[cid] = {**self.members[cid], "parent_id": pid}
+                self._attach(cid, pid)
+            del self.members[mid], self.parent[mid], self.name_key[mid]
+            self.search.remove(mid)
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+    def get(self, mid: int) -> Optional[dict]:
+        return self.members.get(mid)
+
+    def children_of(self, mid: int) -> List[dict]:
+        with self._view_lock:
+            return [self.members[cid] for _, cid in self.children.get(mid, ())]
+
+    def roots_list(self, limit: int) -> List[dict]:
+        with self._view_lock:
+            return [self.members[mid] for _, mid in self.roots[:limit]]
+
+    def search_names(self, query: str, limit: int) -> List[dict]:
+        with self._view_lock:
+            return [self.members[mid] for mid in self.search.search(query, limit)]
+
+    def suggest(self, prefix: str, limit: int, ancestors: int = 3) -> List[dict]:
+        """Prefix matches, each with the names of its nearest `ancestors` forebears."""
+        with self._view_lock:
+            out = []
+            for mid in self.search.suggest(prefix, limit):
+                m = self.members[mid]
+                names, cur = [], self.parent[mid]
+                while cur is not None and cur in self.members and len(names) < ancestors:
+                    names.append(self.members[cur]["full_name"])
+                    cur = self.parent[cur]
+                out.append({"id": mid, "full_name": m["full_name"],
+                            "branch_name": m["branch_name"], "lineage": names})
+            return out
+
+    def lineage(self, mid: int) -> List[dict]:
+        """Ancestors from the top of the branch down to the member itself."""
+        with self._view_lock:
+            chain, seen = [], set()
+            cur = mid
+            while cur is not None and cur in self.members and cur not in seen:
+                seen.add(cur)
+                chain.append(self.members[cur])
+                cur = self.parent[cur]
+            chain.reverse()
+            return chain
+
+    def subtree(self, mid: int, depth: int) -> dict:
+        """Member with descendants nested down to `depth` levels (cycle-safe)."""
+        with self._view_lock:
+            root = {**self.members[mid], "child_count": 0, "children": []}
+            seen = {mid}
+            stack = [(root, 0)]
+            while stack:
+                node, lvl = stack.pop()
+                kids = [cid for _, cid in self.children.get(node["id"], ()) if cid not in seen]
+                node["child_count"] = len(kids)
+                if lvl >= depth:
+                    continue
+                for cid in kids:
+                    seen.add(cid)
+                    child = {**self.members[cid], "child_count": 0, "children": []}
+                    node["children"].append(child)
+                    stack.append((child, lvl + 1))
+            return root
+
+    def stats(self) -> dict:
+        """O(branches + generations) — everything else is a running total."""
+        with self._view_lock:
+            total = len(self.members)
+            branches = [
+                {"branch_name": name, "total": b["total"], "living": b["living"],
+                 "deceased": b["total"] - b["living"], "generations": _generations(b["depths"])}
+                for name, b in self.branches.items()
+            ]
+            branches.sort(key=lambda b: -b["total"])
+            return {"total": total, "living": self.living, "deceased": total - self.living,
+                    "generations": _generations(self.depth_hist), "branches": branches}
+
+
+tree_index = TreeIndex()
@@ -42,7 +42,7 @@ export default function AddMemberForm({ apiBase, onSuccess, parentPerson }) {
     if (debounceRef.current) clearTimeout(debounceRef.current);
     debounceRef.current = setTimeout(async () => {
       try {
-        const res = await fetch(`${apiBase}/search?q=${encodeURIComponent(parentQuery)}&limit=8`);
+        const res = await fetch(`${apiBase}/suggest?prefix=${encodeURIComponent(parentQuery)}&limit=8`);
         const data = await res.json();
         setParentResults(data);
         setParentOpen(true);
@@ -197,6 +197,7 @@ export default function AddMemberForm({ apiBase, onSuccess, parentPerson }) {
                   </div>
                   <div className="flex-1 text-right">
                     <div className="text-sm font-semibold" style={{ color: "#e8f5ec" }}>{p.full_name}</div>
+                    {p.lineage?.length > 0 && <div className="text-xs" style={{ color: "rgba(232,240,235,0.5)" }}>بن {p.lineage.join(" بن ")}</div>}
                     {p.branch_name && <div className="text-xs" style={{ color: "#4db878" }}>{p.branch_name}</div>}
                   </div>
                 </button>
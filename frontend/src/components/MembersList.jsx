@@ -7,15 +7,23 @@ export default function MembersList({ apiBase, onSelectPerson }) {
   const [expanded, setExpanded] = useState(false);
   const [search, setSearch] = useState("");
   const [fetched, setFetched] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+
+  const fetchPage = async (cursor) => {
+    const qs = cursor ? `limit=500&cursor=${encodeURIComponent(cursor)}` : "limit=500";
+    const res = await fetch(`${apiBase}/members?${qs}`);
+    if (!res.ok) throw new Error();
+    const page = await res.json();
+    setNextCursor(res.headers.get("X-Next-Cursor"));
+    return page;
+  };
 
   const fetchMembers = async () => {
     if (fetched) return;
     setLoading(true);
     setError(null);
     try {
-      const res = await fetch(`${apiBase}/members?limit=500`);
-      if (!res.ok) throw new Error();
-      setMembers(await res.json());
+      setMembers(await fetchPage(null));
       setFetched(true);
     } catch {
       setError("حدث خطأ في تحميل الأفراد");
@@ -24,6 +32,19 @@ export default function MembersList({ apiBase, onSelectPerson }) {
     }
   };
 
+  const fetchMore = async () => {
+    if (!nextCursor || loading) return;
+    setLoading(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setMembers(prev => [...prev, ...page]);
+    } catch {
+      setError("حدث خطأ في تحميل الأفراد");
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleExpand = () => {
     setExpanded(v => !v);
     fetchMembers();
@@ -78,7 +99,7 @@ export default function MembersList({ apiBase, onSelectPerson }) {
       {/* Expanded content */}
       {expanded && (
         <div className="mt-3 animate-fade-in-up">
-          {loading && (
+          {loading && !fetched && (
             <div className="flex items-center gap-2 px-4 py-6 text-sm" style={{ color: "rgba(232,240,235,0.4)" }}>
               <div className="w-4 h-4 rounded-full border-2 animate-spin" style={{ borderColor: "rgba(45,122,79,0.3)", borderTopColor: "#2d7a4f" }} />
               جاري التحميل...
@@ -89,7 +110,7 @@ export default function MembersList({ apiBase, onSelectPerson }) {
               {error}
             </div>
           )}
-          {!loading && !error && fetched && (
+          {!error && fetched && (
             <>
               {/* Search filter */}
               <div className="mb-4">
@@ -134,6 +155,13 @@ export default function MembersList({ apiBase, onSelectPerson }) {
                     لا توجد نتائج
                   </div>
                 )}
+                {nextCursor && (
+                  <button onClick={fetchMore} disabled={loading}
+                    className="w-full px-4 py-2.5 rounded-xl text-sm font-bold transition-opacity hover:opacity-80"
+                    style={{ background: "rgba(45,122,79,0.14)", color: "#4db878", border: "1px solid rgba(45,122,79,0.2)" }}>
+                    تحميل المزيد
+                  </button>
+                )}
               </div>
             </>
           )}
@@ -1,4 +1,5 @@
 import React, { useRef, useState } from "react";
+import { photoUrl, avatarProps } from "../photos.js";
 
 const INFO_ICON = {
   email: (
@@ -30,9 +31,7 @@ export default function PersonProfile({ data, onSelectPerson, onAddDescendant, a
   const [uploadError, setUploadError] = useState("");
   const photoInputRef = useRef(null);
 
-  const imageUrl = localImageUrl
-    ? (localImageUrl.startsWith("http") ? localImageUrl : `${apiBase || "http://localhost:8080"}${localImageUrl}`)
-    : null;
+  const imageUrl = photoUrl(apiBase, localImageUrl);
 
   const handlePhotoUpload = async (e) => {
     const file = e.target.files?.[0];
@@ -79,7 +78,7 @@ export default function PersonProfile({ data, onSelectPerson, onAddDescendant, a
             title="اضغط لتغيير الصورة"
           >
             {imageUrl ? (
-              <img src={imageUrl} alt={person.full_name} className="w-full h-full object-cover" />
+              <img {...avatarProps(apiBase, person.id, localImageUrl, 112)} alt={person.full_name} className="w-full h-full object-cover" />
             ) : initial}
             {/* overlay on hover */}
             <div className="absolute inset-0 flex items-center justify-center rounded-2xl opacity-0 group-hover:opacity-100 transition-opacity"
@@ -25,7 +25,7 @@ export default function SearchBar({ apiBase, onSelectPerson }) {
     debounceRef.current = setTimeout(async () => {
       setIsLoading(true);
       try {
-        const res = await fetch(`${apiBase}/search?q=${encodeURIComponent(query)}`);
+        const res = await fetch(`${apiBase}/suggest?prefix=${encodeURIComponent(query)}&limit=10`);
         if (!res.ok) throw new Error("Search failed");
         const data = await res.json();
         setResults(data);
@@ -117,6 +117,11 @@ export default function SearchBar({ apiBase, onSelectPerson }) {
                 <div className="text-sm font-bold truncate" style={{ color: "#e8f5ec" }}>
                   {person.full_name}
                 </div>
+                {person.lineage?.length > 0 && (
+                  <div className="text-xs mt-0.5 truncate" style={{ color: "rgba(232,240,235,0.5)" }}>
+                    بن {person.lineage.join(" بن ")}
+                  </div>
+                )}
                 {person.branch_name && (
                   <div className="text-xs mt-0.5 truncate" style={{ color: "rgba(77,184,120,0.7)" }}>
                     فرع: {person.branch_name}
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from "react";
 import EditMemberModal from "./EditMemberModal.jsx";
+import { avatarProps } from "../photos.js";
 
 /* ── Node colour by gender / is_alive ──────────────────── */
 function nodeStyle(person) {
@@ -12,17 +13,21 @@ function nodeStyle(person) {
 
 /* ── Single Node ───────────────────────────────────────── */
 function TreeNode({ person, apiBase, token, isAdmin, onAddChild, onViewProfile, depth = 0 }) {
-    const [children, setChildren] = useState(null);
-    const [loading, setLoading] = useState(true);
+    // Nodes that came from a /subtree response already carry their children;
+    // only roots and nodes cut off at the depth limit fetch their own branch.
+    const preloaded = Array.isArray(person.children) && (person.child_count ?? 0) <= person.children.length;
+    const [children, setChildren] = useState(preloaded ? person.children : null);
+    const [loading, setLoading] = useState(!preloaded);
     const [editing, setEditing] = useState(false);
     const [localPerson, setLocal] = useState(person);
     const s = nodeStyle(localPerson);
 
     useEffect(() => {
+        if (preloaded) return;
         (async () => {
             try {
-                const res = await fetch(`${apiBase}/children/${localPerson.id}`);
-                setChildren(await res.json());
+                const res = await fetch(`${apiBase}/subtree/${localPerson.id}`);
+                setChildren((await res.json()).children || []);
             } catch { setChildren([]); }
             finally { setLoading(false); }
         })();
@@ -57,7 +62,8 @@ function TreeNode({ person, apiBase, token, isAdmin, onAddChild, onViewProfile,
                 >
                     {localPerson.image_url ? (
                         <img
-                            src={localPerson.image_url.startsWith("http") ? localPerson.image_url : `http://localhost:8080${localPerson.image_url}`}
+                            {...avatarProps(apiBase, localPerson.id, localPerson.image_url, 60)}
+                            loading="lazy"
                             alt={localPerson.full_name}
                             style={{ width: "100%", height: "100%", objectFit: "cover" }}
                         />
@@ -0,0 +1,23 @@
+// Photo URLs. Uploaded photos are served as WebP thumbnails at fixed sizes
+// (see THUMB_SIZES in backend/photos.py); `v` pins the URL to the current
+// file so the browser can cache it for good.
+export const THUMB_SIZES = [64, 128, 256];
+
+export function photoUrl(apiBase, imageUrl) {
+  if (!imageUrl) return null;
+  return imageUrl.startsWith("http") ? imageUrl : `${apiBase || "http://localhost:8080"}${imageUrl}`;
+}
+
+export function thumbUrl(apiBase, memberId, imageUrl, size) {
+  if (!imageUrl || !imageUrl.startsWith("/uploads/")) return photoUrl(apiBase, imageUrl);
+  const v = encodeURIComponent(imageUrl.split("/").pop());
+  return `${apiBase || "http://localhost:8080"}/uploads/${memberId}/thumb/${size}?v=${v}`;
+}
+
+// src + srcSet for an avatar `px` CSS pixels wide: 1x and 2x variants
+export function avatarProps(apiBase, memberId, imageUrl, px) {
+  const fit = (n) => THUMB_SIZES.find((s) => s >= n) || THUMB_SIZES[THUMB_SIZES.length - 1];
+  const src = thumbUrl(apiBase, memberId, imageUrl, fit(px));
+  if (!imageUrl || !imageUrl.startsWith("/uploads/")) return { src };
+  return { src, srcSet: `${src} 1x, ${thumbUrl(apiBase, memberId, imageUrl, fit(px * 2))} 2x` };
+}
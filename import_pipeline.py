@@ -7,8 +7,10 @@
 
   STAGES:
     1. Excel → PNG  (via win32com.client + Excel COM automation)
-    2. PNG  → JSON  (via OpenAI GPT-4o Vision or Anthropic Claude)
-    3. JSON → DB    (via psycopg2 with two-pass parent resolution)
+    2. PNG  → JSON  (via OpenAI GPT-4o Vision or Anthropic Claude,
+                     AI_WORKERS sheets at a time)
+    3. JSON → DB    (via psycopg2: batched INSERTs, then one UPDATE ... FROM
+                     join for parent resolution)
 
   USAGE:
     pip install pywin32 openai anthropic psycopg2-binary pillow
@@ -25,6 +27,7 @@ import base64
 import logging
 import tempfile
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # ── Third-party ───────────────────────────────────────────────────────────────
@@ -71,6 +74,11 @@ DB_TABLE = "family_members"
 # DPI for PNG export (higher = better AI accuracy, but slower)
 EXPORT_DPI = 200
 
+# Concurrent Vision requests. Stage 2 is network-bound, so it runs in threads
+# while Stage 1 keeps exporting; Stage 1 goes through the clipboard and
+# stays serial, and Stage 3 writes from the main thread only.
+AI_WORKERS = int(os.getenv("AI_WORKERS", "4"))
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  LOGGING SETUP
 # ══════════════════════════════════════════════════════════════════════════════
@@ -385,11 +393,35 @@ def ensure_table_exists(conn):
     log.info(f"Table '{DB_TABLE}' is ready.")
 
 
+INSERT_PAGE_SIZE = 1000   # rows per multi-row INSERT statement
+
+
+def _insert_rows(cur, rows: list[tuple]) -> int:
+    """Multi-row INSERT ... ON CONFLICT DO NOTHING. Returns how many rows were new."""
+    returned = psycopg2.extras.execute_values(
+        cur,
+        f"""
+        INSERT INTO {DB_TABLE} (full_name, parent_name, branch_name)
+        VALUES %s
+        ON CONFLICT (full_name, branch_name) DO NOTHING
+        RETURNING id
+        """,
+        rows,
+        page_size=INSERT_PAGE_SIZE,
+        fetch=True,
+    )
+    return len(returned)
+
+
 def insert_records(conn, records: list[dict]) -> dict:
     """
-    Two-pass insertion strategy:
-      Pass 1 → Insert every record (parent_id = NULL for now).
-      Pass 2 → Update parent_id for all records that have a parent_name.
+    Two-pass insertion strategy, one transaction per sheet:
+      Pass 1 → Insert every record (parent_id = NULL for now) with batched
+               multi-row INSERTs. If the batch fails it is redone row by
+               row, each row in its own savepoint, so one bad row costs
+               only itself.
+      Pass 2 → One UPDATE ... FROM join sets parent_id for all records that
+               have a parent_name.
 
     Returns stats dict with counts.
     """
@@ -401,109 +433,86 @@ def insert_records(conn, records: list[dict]) -> dict:
     # ── PASS 1: Insert all records ────────────────────────────────────────
     log.info(f"  Pass 1: Inserting {len(records)} records...")
 
-    with conn.cursor() as cur:
-        for rec in records:
-            full_name   = (rec.get("full_name")   or "").strip()
-            branch_name = (rec.get("branch_name") or "").strip()
-            parent_name = (rec.get("parent_name") or "").strip() or None
-
-            if not full_name:
-                log.warning("  Skipping record with empty full_name.")
-                skipped += 1
-                continue
-
-            try:
-                cur.execute(
-                    f"""
-                    INSERT INTO {DB_TABLE} (full_name, parent_name, branch_name)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (full_name, branch_name) DO NOTHING
-                    RETURNING id
-                    """,
-                    (full_name, parent_name, branch_name),
-                )
-                result = cur.fetchone()
-                if result:
-                    inserted += 1
-                    log.info(
-                        f"    ✓ Inserted: {full_name!r} "
-                        f"(parent: {parent_name!r})"
-                    )
-                else:
-                    skipped += 1
-                    log.info(f"    ~ Skipped (duplicate): {full_name!r}")
-
-            except Exception as e:
-                log.error(f"    ✗ Insert failed for {full_name!r}: {e}")
-                conn.rollback()
-                failed += 1
-                continue
+    rows = []
+    for rec in records:
+        full_name   = (rec.get("full_name")   or "").strip()
+        branch_name = (rec.get("branch_name") or "").strip()
+        parent_name = (rec.get("parent_name") or "").strip() or None
 
-    conn.commit()
-    log.info(f"  Pass 1 complete — inserted: {inserted}, skipped: {skipped}")
+        if not full_name:
+            log.warning("  Skipping record with empty full_name.")
+            skipped += 1
+            continue
+        rows.append((full_name, parent_name, branch_name))
 
-    # ── PASS 2: Resolve parent_id via parent_name ─────────────────────────
-    log.info("  Pass 2: Resolving parent_id references...")
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SAVEPOINT batch_insert")
+            try:
+                inserted = _insert_rows(cur, rows) if rows else 0
+                cur.execute("RELEASE SAVEPOINT batch_insert")
+            except psycopg2.Error as e:
+                cur.execute("ROLLBACK TO SAVEPOINT batch_insert")
+                log.warning(f"  Batch insert failed ({e}); retrying row by row...")
+                for row in rows:
+                    cur.execute("SAVEPOINT row_insert")
+                    try:
+                        inserted += _insert_rows(cur, [row])
+                        cur.execute("RELEASE SAVEPOINT row_insert")
+                    except psycopg2.Error as e:
+                        cur.execute("ROLLBACK TO SAVEPOINT row_insert")
+                        log.error(f"    ✗ Insert failed for {row[0]!r}: {e}")
+                        failed += 1
 
-    with conn.cursor() as cur:
-        cur.execute(
-            f"""
-            SELECT id, full_name, branch_name
-            FROM {DB_TABLE}
-            WHERE parent_name IS NOT NULL AND parent_id IS NULL
-            """
-        )
-        rows_needing_parent = cur.fetchall()
+        skipped += len(rows) - inserted - failed
+        log.info(f"  Pass 1 complete — inserted: {inserted}, skipped: {skipped}")
 
-    log.info(
-        f"  Found {len(rows_needing_parent)} records needing parent_id resolution."
-    )
+        # ── PASS 2: Resolve parent_id via parent_name ─────────────────────
+        # Parent = a row named parent_name, preferring the child's own branch.
+        log.info("  Pass 2: Resolving parent_id references...")
 
-    with conn.cursor() as cur:
-        for row_id, full_name, branch_name in rows_needing_parent:
-            # Fetch parent_name for this record
+        with conn.cursor() as cur:
             cur.execute(
-                f"SELECT parent_name FROM {DB_TABLE} WHERE id = %s",
-                (row_id,),
+                f"""
+                WITH candidates AS (
+                    SELECT DISTINCT ON (c.id) c.id AS child_id, p.id AS parent_id
+                    FROM {DB_TABLE} c
+                    JOIN {DB_TABLE} p
+                      ON p.full_name = btrim(c.parent_name)
+                     AND p.branch_name IS NOT NULL
+                     AND p.id <> c.id
+                    WHERE c.parent_name <> '' AND c.parent_id IS NULL
+                    ORDER BY c.id, (p.branch_name = c.branch_name) IS TRUE DESC, p.id
+                )
+                UPDATE {DB_TABLE} t
+                SET parent_id = candidates.parent_id
+                FROM candidates
+                WHERE t.id = candidates.child_id
+                """
             )
-            parent_name_row = cur.fetchone()
-            if not parent_name_row or not parent_name_row[0]:
-                continue
-
-            parent_name = parent_name_row[0].strip()
+            updated = cur.rowcount
 
-            # Look up the parent within the same branch first, then globally
             cur.execute(
                 f"""
-                SELECT id FROM {DB_TABLE}
-                WHERE full_name = %s
-                  AND (branch_name = %s OR branch_name IS NOT NULL)
-                ORDER BY (branch_name = %s) DESC
-                LIMIT 1
-                """,
-                (parent_name, branch_name, branch_name),
+                SELECT full_name, parent_name, COUNT(*) OVER ()
+                FROM {DB_TABLE}
+                WHERE parent_name <> '' AND parent_id IS NULL
+                ORDER BY id
+                LIMIT 10
+                """
             )
-            parent_row = cur.fetchone()
-
-            if parent_row:
-                parent_id = parent_row[0]
-                cur.execute(
-                    f"UPDATE {DB_TABLE} SET parent_id = %s WHERE id = %s",
-                    (parent_id, row_id),
-                )
-                updated += 1
-                log.info(
-                    f"    ✓ Linked: {full_name!r} → parent_id={parent_id} "
-                    f"({parent_name!r})"
-                )
-            else:
-                log.warning(
-                    f"    ⚠ Parent not found in DB: {parent_name!r} "
-                    f"(child: {full_name!r})"
-                )
-                failed += 1
-
-    conn.commit()
+            unresolved = cur.fetchall()
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if unresolved:
+        failed += unresolved[0][2]
+        log.warning(f"  ⚠ Parent not found in DB for {unresolved[0][2]} record(s), e.g.:")
+        for full_name, parent_name, _ in unresolved:
+            log.warning(f"    {parent_name!r} (child: {full_name!r})")
     log.info(f"  Pass 2 complete — parent_id updated for {updated} records.")
 
     return {
@@ -549,43 +558,49 @@ def run_pipeline():
     # ── Global stats ───────────────────────────────────────────────────────
     total_stats = {"inserted": 0, "skipped": 0, "updated": 0, "failed": 0}
 
-    for xls_path in xls_files:
-        file_stem = Path(xls_path).stem
-        log.info(f"\n{'─' * 60}")
-        log.info(f"Processing file: {file_stem}")
-        log.info(f"{'─' * 60}")
-
-        # ── STAGE 1: Export sheets to PNG ─────────────────────────────────
-        log.info("[Stage 1] Exporting Excel sheets to PNG...")
-        try:
-            exported_sheets = export_sheets_to_png(xls_path, TEMP_IMAGE_DIR)
-        except Exception as e:
-            log.error(f"Stage 1 failed for {file_stem}: {e}")
-            traceback.print_exc()
-            continue
+    with ThreadPoolExecutor(max_workers=AI_WORKERS) as pool:
+        jobs = []   # (sheet_name, future) in export order
 
-        if not exported_sheets:
-            log.warning(f"No sheets exported from {file_stem}. Skipping.")
-            continue
+        for xls_path in xls_files:
+            file_stem = Path(xls_path).stem
+            log.info(f"\n{'─' * 60}")
+            log.info(f"Processing file: {file_stem}")
+            log.info(f"{'─' * 60}")
 
-        log.info(f"  Exported {len(exported_sheets)} sheet(s).")
+            # ── STAGE 1: Export sheets to PNG ─────────────────────────────
+            log.info("[Stage 1] Exporting Excel sheets to PNG...")
+            try:
+                exported_sheets = export_sheets_to_png(xls_path, TEMP_IMAGE_DIR)
+            except Exception as e:
+                log.error(f"Stage 1 failed for {file_stem}: {e}")
+                traceback.print_exc()
+                continue
 
-        for sheet_info in exported_sheets:
-            image_path  = sheet_info["image_path"]
-            branch_name = sheet_info["branch_name"]
-            sheet_name  = sheet_info["sheet_name"]
+            if not exported_sheets:
+                log.warning(f"No sheets exported from {file_stem}. Skipping.")
+                continue
 
-            log.info(
-                f"\n  Sheet: '{sheet_name}' | Branch: '{branch_name}'"
-            )
+            log.info(f"  Exported {len(exported_sheets)} sheet(s).")
 
-            # ── STAGE 2: AI Vision extraction ─────────────────────────────
-            log.info("[Stage 2] Extracting family tree via AI Vision...")
+            # ── STAGE 2: AI Vision extraction (in the background) ─────────
+            for sheet_info in exported_sheets:
+                log.info(
+                    f"[Stage 2] Queued sheet '{sheet_info['sheet_name']}' "
+                    f"| Branch: '{sheet_info['branch_name']}'"
+                )
+                jobs.append((
+                    sheet_info["sheet_name"],
+                    pool.submit(ai_extract, sheet_info["image_path"], sheet_info["branch_name"]),
+                ))
+
+        # ── STAGE 3: Insert into DB — one writer, in export order ─────────
+        for sheet_name, future in jobs:
+            log.info(f"\n  Sheet: '{sheet_name}'")
             try:
-                records = ai_extract(image_path, branch_name)
+                records = future.result()
             except Exception as e:
                 log.error(f"Stage 2 failed for sheet '{sheet_name}': {e}")
-                traceback.print_exc()
+                traceback.print_exception(e)
                 continue
 
             if not records:
@@ -596,7 +611,6 @@ def run_pipeline():
 
             log.info(f"  AI extracted {len(records)} person(s).")
 
-            # ── STAGE 3: Insert into DB ────────────────────────────────────
             log.info("[Stage 3] Inserting into PostgreSQL...")
             try:
                 stats = insert_records(conn, records)
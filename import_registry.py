@@ -7,21 +7,26 @@
   Row N+2 → يحتوي على الرقم العائلي (مثل 1-2-3-0-0-0)
 
 الخوارزمية:
-  1. نجمع locations كل خلية بها رقم عائلي
-  2. نجمع locations كل خلية بها نص عربي
-  3. لكل رقم عائلي نبحث عن أقرب اسم عربي في نطاق ±10 صفوف
+  1. نقرأ الورقة عموداً عموداً ونصنّف الخلايا النصية فقط (مع تخزين النتيجة لكل نص)
+  2. نجمع locations كل خلية بها رقم عائلي وكل خلية بها نص عربي
+  3. لكل رقم عائلي نبحث (بحث ثنائي في الصفوف المرتبة) عن أقرب اسم عربي في نطاق ±10 صفوف
   4. نحدد العلاقات الأبوية من الرقم الهرمي
-  5. ندرج في SQLite بـ two-pass
+  5. ندرج في SQLite بـ two-pass (executemany ومعاملة واحدة) ونعيد حساب path/depth في المعاملة نفسها
 =============================================================================
 """
 import re
 import sys
 import logging
 import sqlite3
+from bisect import bisect_left
+from functools import lru_cache
 from pathlib import Path
 
 import xlrd
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "backend"))
+from path_encoding import compute_paths  # noqa: E402 — same encoding the API maintains, stdlib only
+
 # ─── CONFIG ──────────────────────────────────────────────────────────────────
 XLS_PATH = Path(r"c:\Users\hussi\OneDrive\Desktop\family-tree\FAMILY-TREE\6سجل آل أبوعلي البيطار (1) (1).xls")
 DB_PATH  = Path(r"c:\Users\hussi\OneDrive\Desktop\family-tree\backend\family_tree.db")
@@ -86,37 +91,60 @@ def looks_like_name(val: str) -> bool:
     return True
 
 # ─── STEP 1: Read XLS ────────────────────────────────────────────────────────
-def read_registry() -> list[dict]:
-    log.info(f"Opening: {XLS_PATH.name}")
-    wb = xlrd.open_workbook(str(XLS_PATH))
+@lru_cache(maxsize=None)
+def classify(raw: str) -> tuple[str, str] | None:
+    """("fnum", number) / ("name", text) / None. Cached: registries repeat the same strings a lot."""
+    fnum = normalize_fnum(raw)
+    if fnum:
+        return ("fnum", fnum)
+    if looks_like_name(raw):
+        return ("name", raw.strip())
+    return None
+
+
+def nearest_name_row(name_rows: list[int], frow: int) -> int | None:
+    """
+    Closest row in sorted `name_rows` within ROW_WINDOW of `frow`; on a tie
+    the row above wins — the order the old ±ROW_WINDOW scan visited rows in.
+    """
+    j = bisect_left(name_rows, frow)
+    above = name_rows[j - 1] if j > 0 else None
+    below = name_rows[j] if j < len(name_rows) else None
+    best = None
+    if below is not None and below - frow <= ROW_WINDOW:
+        best = below
+    if above is not None and frow - above <= ROW_WINDOW and (best is None or frow - above <= best - frow):
+        best = above
+    return best
+
+
+def read_registry(xls_path: Path = XLS_PATH) -> list[dict]:
+    log.info(f"Opening: {xls_path.name}")
+    wb = xlrd.open_workbook(str(xls_path))
     sh = wb.sheet_by_index(0)
     log.info(f"Sheet: {sh.nrows} rows × {sh.ncols} cols")
 
-    # ── Collect all family-number positions ──────────────────────────────
+    # ── Classify the sheet a column at a time ────────────────────────────
+    # Only text cells can hold a family number or a name (numbers, dates
+    # and booleans stringify to neither), so the rest are never looked at.
     fnum_positions: list[tuple[int, int, str]] = []  # (row, col, fnum)
-    # Collect all name positions: row → list of candidate names
-    name_by_row: dict[int, list[str]] = {}
-
-    for r in range(sh.nrows):
-        found_fnum_this_row = False
-        for c in range(sh.ncols):
-            cell = sh.cell(r, c)
-            if cell.ctype == 0:
+    name_by_row: dict[int, list[str]] = {}            # row → names, left to right
+
+    for c in range(sh.ncols):
+        for r, (ctype, value) in enumerate(zip(sh.col_types(c), sh.col_values(c))):
+            if ctype != xlrd.XL_CELL_TEXT:
                 continue
-            raw = str(cell.value).strip()
+            raw = value.strip()
             if not raw:
                 continue
-
-            # Check if it's a family number
-            fnum = normalize_fnum(raw)
-            if fnum:
-                fnum_positions.append((r, c, fnum))
-                found_fnum_this_row = True
+            kind = classify(raw)
+            if kind is None:
                 continue
-
-            # Check if it looks like a name
-            if looks_like_name(raw):
-                name_by_row.setdefault(r, []).append(raw.strip())
+            if kind[0] == "fnum":
+                fnum_positions.append((r, c, kind[1]))
+            else:
+                name_by_row.setdefault(r, []).append(kind[1])
+    fnum_positions.sort()  # row-major, like the cell-by-cell scan: the first occurrence wins
 
     log.info(f"  → Family numbers found: {len(fnum_positions)}")
     log.info(f"  → Rows with name candidates: {len(name_by_row)}")
@@ -136,33 +164,23 @@ def read_registry() -> list[dict]:
         return []
 
     # ── Match each family number to the nearest name ──────────────────────
+    # Binary search over the sorted name rows instead of rescanning the
+    # ±ROW_WINDOW rows around every number.
+    name_rows = sorted(name_by_row)
     records: list[dict] = []
     seen_fnums: set[str] = set()
 
     for (frow, fcol, fnum) in fnum_positions:
         if fnum in seen_fnums:
             continue
-
-        # Search window around frow
-        best_name  = None
-        best_dist  = ROW_WINDOW + 1
-
-        for r in range(max(0, frow - ROW_WINDOW), min(sh.nrows, frow + ROW_WINDOW + 1)):
-            if r not in name_by_row:
-                continue
-            for name in name_by_row[r]:
-                dist = abs(r - frow)
-                if dist < best_dist:
-                    best_dist = dist
-                    best_name = name
-
-        if not best_name:
+        row = nearest_name_row(name_rows, frow)
+        if row is None:
             continue
 
         seen_fnums.add(fnum)
         records.append({
             "family_number": fnum,
-            "full_name":     best_name,
+            "full_name":     name_by_row[row][0],
             "branch_name":   BRANCH,
             "parent_number": parent_of(fnum),
         })
@@ -193,48 +211,74 @@ def insert_to_db(records: list[dict]):
     """)
     conn.commit()
 
-    fnum_to_id: dict[str, int] = {}
-    inserted = skipped = updated = missing = 0
-
-    # ── PASS 1: Insert all ────────────────────────────────────────────────
-    log.info("Pass 1: inserting records...")
-    for rec in records:
-        cur.execute(
-            "SELECT id FROM family_members WHERE full_name=? AND branch_name=?",
-            (rec["full_name"], rec["branch_name"]),
-        )
-        row = cur.fetchone()
-        if row:
-            fnum_to_id[rec["family_number"]] = row[0]
-            skipped += 1
-            continue
+    def columns(table: str) -> set[str]:
+        """Column names of `table`; empty if it does not exist."""
+        return {row[1] for row in cur.execute(f"PRAGMA table_info({table})").fetchall()}
 
+    def ids_by_name() -> dict[tuple[str, str], int]:
+        """(name, branch) → lowest id, as the old per-record SELECT returned."""
+        branches = sorted({r["branch_name"] for r in records})
         cur.execute(
-            "INSERT INTO family_members (full_name, branch_name) VALUES (?, ?)",
-            (rec["full_name"], rec["branch_name"]),
+            "SELECT full_name, branch_name, MIN(id) FROM family_members "
+            f"WHERE branch_name IN ({', '.join('?' * len(branches))}) GROUP BY full_name, branch_name",
+            branches,
         )
-        fnum_to_id[rec["family_number"]] = cur.lastrowid
-        inserted += 1
+        return {(name, branch): mid for name, branch, mid in cur.fetchall()}
 
-    conn.commit()
+    # ── PASS 1: Insert each new (name, branch) once, in record order ─────
+    # A name already in the table, or met earlier in the same run, maps to
+    # that row instead. One lookup query, one executemany.
+    log.info("Pass 1: inserting records...")
+    first_seen = dict.fromkeys((r["full_name"], r["branch_name"]) for r in records)
+    ids = ids_by_name()
+    new_names = [key for key in first_seen if key not in ids]
+    cur.executemany("INSERT INTO family_members (full_name, branch_name) VALUES (?, ?)", new_names)
+    if new_names:
+        ids = ids_by_name()
+    inserted = len(new_names)
+    skipped = len(records) - inserted
+    fnum_to_id = {r["family_number"]: ids[(r["full_name"], r["branch_name"])] for r in records}
     log.info(f"  inserted={inserted}  skipped={skipped}")
 
     # ── PASS 2: Resolve parent_id ─────────────────────────────────────────
+    # Records sharing a member (same name): the first with a resolved parent
+    # wins, and a parent_id that is already set is kept.
     log.info("Pass 2: resolving parent_id...")
+    links: dict[int, int] = {}
+    updated = missing = 0
     for rec in records:
-        child_id   = fnum_to_id.get(rec["family_number"])
         parent_num = rec["parent_number"]
-        if child_id is None or parent_num is None:
+        if parent_num is None:
             continue
         parent_id = fnum_to_id.get(parent_num)
         if parent_id is None:
             missing += 1
             continue
+        links.setdefault(fnum_to_id[rec["family_number"]], parent_id)
+        updated += 1
+    cur.executemany(
+        "UPDATE family_members SET parent_id=? WHERE id=? AND parent_id IS NULL",
+        [(parent_id, child_id) for child_id, parent_id in links.items()],
+    )
+
+    # ── path/depth (backend/lineage.py) from the new parent_ids ──────────
+    # Rewritten in this same transaction, so the API never sees rows
+    # without a path (the columns only exist once it has migrated the file).
+    if {"path", "depth"} <= columns("family_members"):
+        cur.execute("SELECT id, parent_id FROM family_members")
+        encoded = compute_paths(cur.fetchall())
+        cur.executemany(
+            "UPDATE family_members SET path=?, depth=? WHERE id=?",
+            [(path, depth, mid) for mid, (path, depth) in encoded.items()],
+        )
+
+    # Tell running API workers their cached tree and ETags are stale
+    # (the table only exists once the API has migrated this database).
+    if columns("data_version"):
         cur.execute(
-            "UPDATE family_members SET parent_id=? WHERE id=? AND parent_id IS NULL",
-            (parent_id, child_id),
+            "UPDATE data_version SET version = version + 1, "
+            "updated_at = strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now') WHERE id = 1"
         )
-        updated += 1
 
     conn.commit()
     conn.close()
@@ -1,25 +1,17 @@
 """
-One-time migration: adds the is_alive column to existing family_members table.
-Run this ONCE if you get 'no such column: family_members.is_alive'.
-"""
-import sqlite3
-from pathlib import Path
-
-DB = Path(r"c:\Users\hussi\OneDrive\Desktop\family-tree\backend\family_tree.db")
+Bring the family-tree database schema up to date.
 
-conn = sqlite3.connect(str(DB))
-cur  = conn.cursor()
+Thin wrapper around backend/migrations.py, which the API also runs at
+startup. Uses the same DATABASE_URL as the backend.
 
-# Check if column exists
-cur.execute("PRAGMA table_info(family_members)")
-cols = [row[1] for row in cur.fetchall()]
-print(f"Existing columns: {cols}")
+    python migrate.py            # apply pending migrations
+    python migrate.py status     # show current / latest version
+"""
+import os
+import runpy
+import sys
 
-if "is_alive" not in cols:
-    cur.execute("ALTER TABLE family_members ADD COLUMN is_alive INTEGER NOT NULL DEFAULT 1")
-    conn.commit()
-    print("✅ Column 'is_alive' added successfully!")
-else:
-    print("✅ Column 'is_alive' already exists — nothing to do.")
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND)
 
-conn.close()
+runpy.run_path(os.path.join(BACKEND, "migrations.py"), run_name="__main__")